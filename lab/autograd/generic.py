@@ -1,5 +1,5 @@
 from types import FunctionType
-from typing import Union
+from typing import Optional, Union
 
 import autograd.numpy as anp
 import autograd.scipy.special as asps
@@ -44,6 +44,42 @@ def imag(a: Numeric):
     return anp.imag(a)
 
 
+@dispatch
+def fft(a: Numeric, axis: Int = -1):
+    return anp.fft.fft(a, axis=axis)
+
+
+@dispatch
+def ifft(a: Numeric, axis: Int = -1):
+    return anp.fft.ifft(a, axis=axis)
+
+
+# AutoGrad does not implement the gradients of `anp.fft.rfft` and `anp.fft.irfft` for
+# odd lengths, so implement these in terms of `anp.fft.fft` and `anp.fft.ifft`.
+
+
+def _index_axis(a, axis, index):
+    indices = [slice(None)] * a.ndim
+    indices[axis] = index
+    return a[tuple(indices)]
+
+
+@dispatch
+def rfft(a: Numeric, axis: Int = -1):
+    n = a.shape[axis]
+    return _index_axis(anp.fft.fft(a, axis=axis), axis, slice(None, n // 2 + 1))
+
+
+@dispatch
+def irfft(a: Numeric, n: Optional[Int] = None, axis: Int = -1):
+    if n is None:
+        n = 2 * (a.shape[axis] - 1)
+    a = _index_axis(a, axis, slice(None, n // 2 + 1))
+    # Reconstruct the negative frequencies by Hermitian symmetry.
+    negative = anp.conj(_index_axis(a, axis, slice(n - n // 2 - 1, 0, -1)))
+    return anp.real(anp.fft.ifft(anp.concatenate((a, negative), axis=axis), axis=axis))
+
+
 @dispatch
 def device(a: AGNumeric):
     return "cpu"
@@ -1,12 +1,21 @@
 import logging
+from types import FunctionType
 from typing import Optional, Union
 
 import autograd.numpy as anp
 import autograd.scipy.linalg as asla
 import opt_einsum as oe
 
-from ..custom import expm, logm, s_expm, s_logm, s_toeplitz_solve, toeplitz_solve
-from ..linear_algebra import _default_perm
+from ..custom import (
+    _expm_dtype,
+    _expm_intermediates,
+    _s_expm,
+    logm,
+    s_logm,
+    s_toeplitz_solve,
+    toeplitz_solve,
+)
+from ..linear_algebra import _default_perm, _s_cg_solve
 from ..types import Int
 from ..util import batch_computation, resolve_axis
 from . import B, Numeric, dispatch
@@ -71,9 +80,26 @@ def svd(a: Numeric, compute_uv: bool = True):
     return (res[0], res[1], anp.conj(transpose(res[2]))) if compute_uv else res
 
 
+@dispatch
+def svdvals(a: Numeric):
+    return anp.linalg.svd(a, compute_uv=False)
+
+
 @dispatch
 def eig(a: Numeric, compute_eigvecs: bool = True):  # pragma: no cover
-    raise NotImplementedError("Function `quantile` is not available for AutoGrad.")
+    raise NotImplementedError("Function `eig` is not available for AutoGrad.")
+
+
+@dispatch
+def eigvals(a: Numeric):  # pragma: no cover
+    raise NotImplementedError("Function `eigvals` is not available for AutoGrad.")
+
+
+@dispatch
+def eigh(a: Numeric, compute_eigvecs: bool = True):
+    # AutoGrad only implements the gradient of `eigh`.
+    vals, vecs = anp.linalg.eigh(a)
+    return (vals, vecs) if compute_eigvecs else vals
 
 
 @dispatch
@@ -96,12 +122,21 @@ def logdet(a: Numeric):
     return anp.linalg.slogdet(a)[1]
 
 
-_expm = autograd_register(expm, s_expm)
-
-
 @dispatch
 def expm(a: Numeric):
-    return _expm(a)
+    # Share the intermediate results of the forward pass with the backward pass. The
+    # closures keep them alive only as long as AutoGrad holds on to the computation.
+    intermediates = []
+
+    def _expm(a):
+        y, intermediates_y = _expm_intermediates(a.astype(_expm_dtype(a), copy=False))
+        intermediates.append(intermediates_y)
+        return y
+
+    def _s_expm_shared(s_y, y, a):
+        return _s_expm(s_y, intermediates[0])
+
+    return autograd_register(_expm, _s_expm_shared)(a)
 
 
 _logm = autograd_register(logm, s_logm)
@@ -129,6 +164,7 @@ def triangular_solve(a: Numeric, b: Numeric, lower_a: bool = True):
             a_, b_, trans="N", lower=lower_a, check_finite=False
         )
 
+    # There is no batched triangular solve to use as a vectorised implementation.
     return batch_computation(_triangular_solve, (a, b), (2, 2))
 
 
@@ -138,3 +174,16 @@ _toeplitz_solve = autograd_register(toeplitz_solve, s_toeplitz_solve)
 @dispatch
 def toeplitz_solve(a: Numeric, b: Numeric, c: Numeric):
     return _toeplitz_solve(a, b, c)
+
+
+@dispatch
+def _smallest_k(a: Numeric, k: Int):
+    return anp.argsort(a, axis=-1)[..., :k]
+
+
+@dispatch
+def _cg_solve_implicit(a: Numeric, b: Numeric, solve: FunctionType):
+    _solve = autograd_register(
+        solve, lambda s_x, x, a, b: _s_cg_solve(solve, s_x, x, a, b)
+    )
+    return _solve(a, b)
@@ -35,7 +35,9 @@ def diag(a: Numeric):
 
 @dispatch
 def diag_extract(a: Numeric):
-    return anp.diagonal(a, axis1=-2, axis2=-1)
+    # The gradient of `anp.diagonal` only supports `axis1=-1` and `axis2=-2`. This
+    # gives the same diagonal.
+    return anp.diagonal(a, axis1=-1, axis2=-2)
 
 
 @dispatch
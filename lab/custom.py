@@ -3,6 +3,7 @@ from collections import namedtuple
 from functools import reduce
 
 import numpy as np
+import scipy.fft as sfft
 import scipy.linalg as sla
 
 TensorDescription = namedtuple("TensorDescription", "shape dtype")
@@ -66,6 +67,13 @@ except ImportError:  # pragma: no cover
         )
 
 
+try:
+    # noinspection PyUnresolvedReferences
+    from .levinson import levinson as _levinson
+except ImportError:  # pragma: no cover
+    _levinson = None
+
+
 __all__ = [
     "toeplitz_solve",
     "i_toeplitz_solve",
@@ -88,86 +96,141 @@ __all__ = [
 log = logging.getLogger(__name__)
 
 
-def _mm(a, b):
-    """Short hand for `np.matmul`.
+def _toeplitz_shapes(a, b, c):
+    """Determine the batch shape of a Toeplitz system and whether the RHS is a vector.
 
     Args:
-        a (tensor): First tensor in product.
-        b (tensor): Second tensor in product.
-
-    Return:
-        tensor: Matrix product of `a` and `b`.
-    """
-
-    return np.matmul(a, b)
-
-
-def _t(a):
-    """Transpose `a`, correctly handling the case where `a` is rank one.
-
-    Args:
-        a (tensor): Tensor to transpose.
+        a (tensor): First column of the Toeplitz matrix.
+        b (tensor): *Except for the first element*, first row of the Toeplitz matrix.
+        c (tensor): RHS. This is a vector if it has the same rank as `a`.
 
     Returns:
-        tensor: Transposition of `a`.
+        tuple[int]: Batch shape.
+        bool: `True` if `c` is a vector.
     """
-    if a.ndim == 1:
-        return a[None, :]
-    else:
-        return np.transpose(a)
+    vector = c.ndim == a.ndim
+    c_batch_shape = c.shape[:-1] if vector else c.shape[:-2]
+    batch_shape = np.broadcast_shapes(a.shape[:-1], b.shape[:-1], c_batch_shape)
+    return batch_shape, vector
 
 
-def _uprank(a):
-    """Get `a` as a rank-two tensor, correctly handling the case where `a` is
-    rank one.
+def _unbroadcast(x, shape):
+    """Sum a tensor over the dimensions that were created by broadcasting to its
+    shape.
 
     Args:
-        a (tensor): Tensor to get as a rank-two tensor.
+        x (tensor): Tensor.
+        shape (tuple[int]): Shape before broadcasting.
 
     Returns:
-        tensor: `a` as a rank-two vector.
+        tensor: `x` summed to `shape`.
     """
-    if a.ndim == 1:
-        return a[:, None]
-    else:
-        return a
+    x = np.sum(x, axis=tuple(range(x.ndim - len(shape))))
+    axes = tuple(i for i, d in enumerate(shape) if d == 1 and x.shape[i] != 1)
+    return np.sum(x, axis=axes, keepdims=True)
 
 
 def toeplitz_solve(a, b, c):
-    # For some reason, `sla.solve_toeplitz` sometimes fails with a `ValueError`, saying
-    # that the buffer source array is read-only. We resolve this issue by copying the
-    # inputs....
-    # TODO: Resolve this properly.
-    a = np.copy(a)
-    b = np.copy(b)
-    c = np.copy(c)
     res_dtype = promote_dtype_of_tensors(a, b, c)
-    row = np.concatenate((a[:1], b))  # First row of the Toeplitz matrix
-    return sla.solve_toeplitz((a, row), c).astype(res_dtype)
+    batch_shape, vector = _toeplitz_shapes(a, b, c)
+    n = a.shape[-1]
+    if vector:
+        c = c[..., None]
+    k = c.shape[-1]
+
+    # The compiled kernel only handles real numbers. Solve complex systems with SciPy
+    # rather than dropping the imaginary parts.
+    complex = np.issubdtype(res_dtype, np.complexfloating)
+
+    # Bring all systems into the batch form expected by `_levinson`. If no
+    # broadcasting is necessary, this does not copy.
+    if complex or res_dtype in {np.float32, np.float64}:
+        dtype = res_dtype
+    else:
+        dtype = np.float64
+    a = np.broadcast_to(a.astype(dtype, copy=False), batch_shape + (n,))
+    b = np.broadcast_to(b.astype(dtype, copy=False), batch_shape + (n - 1,))
+    c = np.broadcast_to(c.astype(dtype, copy=False), batch_shape + (n, k))
+    size = int(np.prod(batch_shape))
+    a = np.ascontiguousarray(a.reshape(size, n))
+    b = np.ascontiguousarray(b.reshape(size, n - 1))
+    c = np.ascontiguousarray(c.reshape(size, n, k))
+
+    if _levinson is not None and not complex:
+        x, info = _levinson(a, b, c)
+        if np.any(info > 0):
+            raise np.linalg.LinAlgError("Singular principal minor.")
+    else:
+        # For some reason, `sla.solve_toeplitz` sometimes fails with a `ValueError`,
+        # saying that the buffer source array is read-only. We resolve this issue by
+        # copying the inputs.
+        x = np.stack(
+            [
+                sla.solve_toeplitz(
+                    (np.copy(a_i), np.concatenate((a_i[:1], b_i))), np.copy(c_i)
+                )
+                for a_i, b_i, c_i in zip(a, b, c)
+            ],
+            axis=0,
+        )
+
+    x = x.reshape(batch_shape + (n, k))
+    if vector:
+        x = x[..., 0]
+    return x.astype(res_dtype, copy=False)
 
 
 def i_toeplitz_solve(a, b, c):
-    return TensorDescription(c.shape, promote_dtype_of_tensors(a, b, c))
+    batch_shape, vector = _toeplitz_shapes(a, b, c)
+    shape = batch_shape + (c.shape[-1:] if vector else c.shape[-2:])
+    return TensorDescription(shape, promote_dtype_of_tensors(a, b, c))
 
 
 def s_toeplitz_solve(s_y, y, a, b, c):
+    _, vector = _toeplitz_shapes(a, b, c)
+    n = a.shape[-1]
+
     # Compute `a` and `b` to get the transpose of the Toeplitz matrix.
-    a_t = np.concatenate((a[:1], b))
-    b_t = a[1:]
+    batch_shape = np.broadcast_shapes(a.shape[:-1], b.shape[:-1])
+    a_t = np.concatenate(
+        (
+            np.broadcast_to(a[..., :1], batch_shape + (1,)),
+            np.broadcast_to(b, batch_shape + (n - 1,)),
+        ),
+        axis=-1,
+    )
+    b_t = a[..., 1:]
 
     # Compute the sensitivity w.r.t `c`.
     s_c = toeplitz_solve(a_t, b_t, s_y)
 
-    # Compute the sensitivity w.r.t. the transposed inverse of the Toeplitz
-    # matrix.
-    s_inv = -_mm(_uprank(s_c), _t(y))
-
-    # Finally, compute the sensitivities w.r.t. `a` and `c`.
-    n = a.shape[0]
-    s_a = np.array([s_inv.diagonal(-i).sum() for i in range(n)])
-    s_b = np.array([s_inv.diagonal(i).sum() for i in range(1, n)])
+    # The sensitivity w.r.t. the transposed inverse of the Toeplitz matrix is
+    # `-s_c y^T`. The sensitivities w.r.t. `a` and `b` are sums over the diagonals of
+    # this matrix, which are the cross-correlations between `s_c` and `y`. Compute
+    # these with the FFT, summing over the columns in the frequency domain.
+    if vector:
+        s_c_cols, y_cols = s_c[..., None], y[..., None]
+    else:
+        s_c_cols, y_cols = s_c, y
+    size = sfft.next_fast_len(2 * n - 1, real=True)
+    spectrum = np.sum(
+        np.conj(np.fft.rfft(s_c_cols, size, axis=-2))
+        * np.fft.rfft(y_cols, size, axis=-2),
+        axis=-1,
+    )
+    # Element `i` of `corr` is the sum over diagonal `i`, where negative indices wrap
+    # around.
+    corr = -np.fft.irfft(spectrum, size, axis=-1)
+    dtype = promote_dtype_of_tensors(s_c, y)
+    s_a = np.concatenate((corr[..., :1], corr[..., : size - n : -1]), axis=-1)
+    s_a = s_a.astype(dtype, copy=False)
+    s_b = corr[..., 1:n].astype(dtype, copy=False)
 
-    return s_a, s_b, s_c
+    return (
+        _unbroadcast(s_a, a.shape),
+        _unbroadcast(s_b, b.shape),
+        _unbroadcast(s_c, c.shape),
+    )
 
 
 def i_s_toeplitz_solve(s_y, y, a, b, c):
@@ -200,20 +263,150 @@ def s_bvn_cdf(s_y, y, a, b, c):
     return tuple(x.astype(res_dtype) for x in res)
 
 
+# Coefficients of the degree-13 Padé approximant and the largest 1-norm for which it
+# is accurate to double precision. See Higham (2005), "The Scaling and Squaring Method
+# for the Matrix Exponential Revisited".
+_expm_b = (
+    64764752532480000.0,
+    32382376266240000.0,
+    7771770303897600.0,
+    1187353796428800.0,
+    129060195264000.0,
+    10559470521600.0,
+    670442572800.0,
+    33522128640.0,
+    1323241920.0,
+    40840800.0,
+    960960.0,
+    16380.0,
+    182.0,
+    1.0,
+)
+_expm_theta = 5.371920351148152
+
+
+def _expm_intermediates(a):
+    """Compute the matrix exponential of a batch of matrices with the scaling-and-
+    squaring method and a degree-13 Padé approximant. Every matrix is scaled
+    separately.
+
+    Args:
+        a (tensor): Batch of matrices.
+
+    Returns:
+        tensor: Matrix exponential.
+        dict: Intermediate results.
+    """
+    b = _expm_b
+    norm = np.max(np.sum(np.abs(a), axis=-2), axis=-1)
+    # Do not scale matrices with non-finite elements. Their results are not finite
+    # anyway.
+    norm = np.where(np.isfinite(norm), norm, 0)
+    with np.errstate(divide="ignore"):
+        s = np.maximum(0, np.ceil(np.log2(norm / _expm_theta))).astype(int)
+    scale = (2.0**-s)[..., None, None]
+    a = a * scale
+    identity = np.eye(a.shape[-1], dtype=a.dtype)
+
+    a2 = a @ a
+    a4 = a2 @ a2
+    a6 = a2 @ a4
+    w1 = b[13] * a6 + b[11] * a4 + b[9] * a2
+    w2 = b[7] * a6 + b[5] * a4 + b[3] * a2 + b[1] * identity
+    z1 = b[12] * a6 + b[10] * a4 + b[8] * a2
+    z2 = b[6] * a6 + b[4] * a4 + b[2] * a2 + b[0] * identity
+    w = a6 @ w1 + w2
+    u = a @ w
+    v = a6 @ z1 + z2
+    # The denominator of the Padé approximant is used twice, so invert it once.
+    inv_q = np.linalg.inv(v - u)
+    r0 = inv_q @ (u + v)
+
+    # Square the matrices as many times as they were scaled down.
+    r = r0
+    squares = []
+    for k in range(np.max(s, initial=0)):
+        squares.append(r)
+        r = np.where((k < s)[..., None, None], r @ r, r)
+
+    return r, {
+        "s": s,
+        "scale": scale,
+        "a": a,
+        "a2": a2,
+        "a4": a4,
+        "a6": a6,
+        "w1": w1,
+        "z1": z1,
+        "w": w,
+        "inv_q": inv_q,
+        "r": r0,
+        "squares": squares,
+    }
+
+
+def _expm_frechet(intermediates, e):
+    """Compute the Fréchet derivative of the matrix exponential for a batch of
+    matrices in a batch of directions, reusing the intermediate results of
+    :func:`_expm_intermediates`. See Al-Mohy and Higham (2009), "Computing the Fréchet
+    Derivative of the Matrix Exponential, with an Application to Condition Number
+    Estimation".
+
+    Args:
+        intermediates (dict): Intermediate results of :func:`_expm_intermediates`.
+        e (tensor): Directions.
+
+    Returns:
+        tensor: Fréchet derivatives.
+    """
+    b = _expm_b
+    a, a2, a4, a6 = (intermediates[k] for k in ["a", "a2", "a4", "a6"])
+    w1, z1, w = (intermediates[k] for k in ["w1", "z1", "w"])
+    s = intermediates["s"]
+
+    e = e * intermediates["scale"]
+    m2 = a @ e + e @ a
+    m4 = a2 @ m2 + m2 @ a2
+    m6 = a4 @ m2 + m4 @ a2
+    l_w1 = b[13] * m6 + b[11] * m4 + b[9] * m2
+    l_w2 = b[7] * m6 + b[5] * m4 + b[3] * m2
+    l_z1 = b[12] * m6 + b[10] * m4 + b[8] * m2
+    l_z2 = b[6] * m6 + b[4] * m4 + b[2] * m2
+    l_w = a6 @ l_w1 + m6 @ w1 + l_w2
+    l_u = a @ l_w + e @ w
+    l_v = a6 @ l_z1 + m6 @ z1 + l_z2
+    res = intermediates["inv_q"] @ (l_u + l_v + (l_u - l_v) @ intermediates["r"])
+
+    for k, r in enumerate(intermediates["squares"]):
+        res = np.where((k < s)[..., None, None], r @ res + res @ r, res)
+
+    return res
+
+
+def _expm_dtype(a):
+    # Integer matrices have a floating exponential.
+    return a.dtype if np.issubdtype(a.dtype, np.inexact) else np.float64
+
+
 def expm(a):
-    # This sometimes fails that the buffer source array is read-only. We resolve this
-    # issue by copying the inputs. See also `toeplitz_solve`.
-    # TODO: Resolve this properly.
-    a = np.copy(a)
-    return sla.expm(a)
+    return _expm_intermediates(a.astype(_expm_dtype(a), copy=False))[0]
 
 
 def i_expm(a):
-    return TensorDescription(a.shape, a.dtype)
+    return TensorDescription(a.shape, _expm_dtype(a))
+
+
+def _s_expm(s_y, intermediates):
+    # The sensitivity is the Fréchet derivative at `a^T` in the direction `s_y`, which
+    # is the transpose of the Fréchet derivative at `a` in the direction `s_y^T`.
+    s_y_t = np.swapaxes(s_y, -1, -2)
+    return np.swapaxes(_expm_frechet(intermediates, s_y_t), -1, -2)
 
 
 def s_expm(s_y, y, a):
-    return sla.expm_frechet(a, s_y.T, compute_expm=False).T
+    # Without a forward pass to share them with, recompute the intermediate results.
+    _, intermediates = _expm_intermediates(a.astype(_expm_dtype(a), copy=False))
+    return _s_expm(s_y, intermediates)
 
 
 def i_s_expm(s_y, y, a):
@@ -222,7 +415,7 @@ def i_s_expm(s_y, y, a):
 
 def logm(a):
     # This sometimes fails that the buffer source array is read-only. We resolve this
-    # issue by copying the inputs. See also `toeplitz_solve`.
+    # issue by copying the inputs.
     # TODO: Resolve this properly.
     a = np.copy(a)
     return sla.logm(a)
@@ -1,7 +1,7 @@
 import warnings
 from functools import wraps
 from types import FunctionType
-from typing import Callable, Union
+from typing import Callable, Optional, Union
 
 import numpy as np
 from plum import add_conversion_method, convert
@@ -31,6 +31,10 @@ __all__ = [
     "isnan",
     "real",
     "imag",
+    "fft",
+    "ifft",
+    "rfft",
+    "irfft",
     "ActiveDevice",
     "device",
     "on_device",
@@ -101,6 +105,7 @@ __all__ = [
     "ne",
     "bvn_cdf",
     "cond",
+    "while_loop",
     "where",
     "scan",
     "sort",
@@ -237,6 +242,65 @@ def imag(a: Numeric):  # pragma: no cover
     """
 
 
+@dispatch
+@abstract()
+def fft(a: Numeric, axis: Int = -1):  # pragma: no cover
+    """Compute the discrete Fourier transform of a tensor.
+
+    Args:
+        a (tensor): Tensor.
+        axis (int, optional): Axis to compute the transform along. Defaults to `-1`.
+
+    Returns:
+        tensor: Discrete Fourier transform of `a`.
+    """
+
+
+@dispatch
+@abstract()
+def ifft(a: Numeric, axis: Int = -1):  # pragma: no cover
+    """Compute the inverse discrete Fourier transform of a tensor.
+
+    Args:
+        a (tensor): Tensor.
+        axis (int, optional): Axis to compute the transform along. Defaults to `-1`.
+
+    Returns:
+        tensor: Inverse discrete Fourier transform of `a`.
+    """
+
+
+@dispatch
+@abstract()
+def rfft(a: Numeric, axis: Int = -1):  # pragma: no cover
+    """Compute the discrete Fourier transform of a real tensor. Only the
+    non-negative frequencies are returned.
+
+    Args:
+        a (tensor): Real tensor.
+        axis (int, optional): Axis to compute the transform along. Defaults to `-1`.
+
+    Returns:
+        tensor: Discrete Fourier transform of `a` for the non-negative frequencies.
+    """
+
+
+@dispatch
+@abstract()
+def irfft(a: Numeric, n: Optional[Int] = None, axis: Int = -1):  # pragma: no cover
+    """Compute the inverse of :func:`.generic.rfft`.
+
+    Args:
+        a (tensor): Discrete Fourier transform for the non-negative frequencies.
+        n (int, optional): Length of the output along `axis`. Defaults to
+            `2 * (m - 1)` where `m` is the length of `a` along `axis`.
+        axis (int, optional): Axis to compute the transform along. Defaults to `-1`.
+
+    Returns:
+        tensor: Real tensor.
+    """
+
+
 class ActiveDevice:
     """Context manager that tracks and changes the active device.
 
@@ -1418,6 +1482,50 @@ def _cond(condition: Numeric, f_true: FunctionType, f_false: FunctionType, *args
         return f_false(*args)
 
 
+def _as_state(x):
+    # The body of a while loop may return a single state variable.
+    return tuple(x) if isinstance(x, (tuple, list)) else (x,)
+
+
+@dispatch
+def while_loop(f_cond: FunctionType, f_body: FunctionType, *init_state):
+    """A while loop that is part of the computation graph.
+
+    The number of iterations is determined by the data, so it is never recorded by
+    :func:`.generic.jit`. For JAX and TensorFlow, the loop compiles to a native loop.
+    The tracing JIT of PyTorch cannot represent such a loop, so tracing it raises an
+    error.
+
+    Args:
+        f_cond (function): Function which takes in the state and returns whether the
+            loop should continue.
+        f_body (function): Function which takes in the state and returns the new state.
+        *init_state (object): Initial state.
+
+    Returns:
+        object: Final state. If there are multiple state variables, then this is a
+            tuple.
+    """
+    state = _as_state(_while_loop(f_cond, f_body, *init_state))
+    return state[0] if len(state) == 1 else state
+
+
+@dispatch
+def _while_loop(f_cond: FunctionType, f_body: FunctionType, *init_state):
+    state = init_state
+    while True:
+        proceed = f_cond(*state)
+        if B.isabstract(proceed):
+            raise RuntimeError(
+                "Cannot run a while loop with a data-dependent number of iterations "
+                "on abstract tensors, because the number of iterations would be "
+                "fixed."
+            )
+        if not proceed:
+            return state
+        state = _as_state(f_body(*state))
+
+
 @dispatch
 @abstract(promote=3)
 def where(condition, a, b):  # pragma: no cover
@@ -1,5 +1,5 @@
 from types import FunctionType
-from typing import Union
+from typing import Optional, Union
 
 import jax
 import jax.nn as jnn
@@ -8,6 +8,7 @@ import jax.scipy.special as jsps
 from plum import isinstance
 
 from ..custom import bvn_cdf, i_bvn_cdf, i_s_bvn_cdf, s_bvn_cdf
+from ..generic import _as_state
 from ..types import (
     Int,
     JAXDType,
@@ -45,6 +46,27 @@ def _jit_run(
     return compilation_cache["jax"](*args, **kw_args)
 
 
+@dispatch
+def _while_loop(
+    f_cond: FunctionType,
+    f_body: FunctionType,
+    *init_state: Union[Numeric, Number],
+):
+    try:
+        # If the values are concrete, run the loop in Python, which can be
+        # reverse-mode differentiated.
+        state = init_state
+        while f_cond(*state):
+            state = _as_state(f_body(*state))
+        return state
+    except jax.errors.ConcretizationTypeError:
+        return jax.lax.while_loop(
+            lambda state: f_cond(*state),
+            lambda state: _as_state(f_body(*state)),
+            tuple(init_state),
+        )
+
+
 @dispatch
 def isnan(a: Numeric):
     return jnp.isnan(a)
@@ -60,6 +82,26 @@ def imag(a: Numeric):
     return jnp.imag(a)
 
 
+@dispatch
+def fft(a: Numeric, axis: Int = -1):
+    return jnp.fft.fft(a, axis=axis)
+
+
+@dispatch
+def ifft(a: Numeric, axis: Int = -1):
+    return jnp.fft.ifft(a, axis=axis)
+
+
+@dispatch
+def rfft(a: Numeric, axis: Int = -1):
+    return jnp.fft.rfft(a, axis=axis)
+
+
+@dispatch
+def irfft(a: Numeric, n: Optional[Int] = None, axis: Int = -1):
+    return jnp.fft.irfft(a, n=n, axis=axis)
+
+
 @dispatch
 def device(a: JAXNumeric):
     return a.device_buffer.device()
@@ -1,25 +1,20 @@
 import logging
+from types import FunctionType
 from typing import Optional, Union
 
+import jax
 import jax.numpy as jnp
 import jax.scipy.linalg as jsla
+import numpy as np
 import opt_einsum as oe
 
-from ..custom import (
-    expm,
-    i_expm,
-    i_logm,
-    i_s_expm,
-    i_s_logm,
-    i_s_toeplitz_solve,
-    i_toeplitz_solve,
-    logm,
-    s_expm,
-    s_logm,
-    s_toeplitz_solve,
-    toeplitz_solve,
+from ..custom import i_logm, i_s_logm, logm, s_logm
+from ..linear_algebra import (
+    _default_perm,
+    _levinson_check,
+    _levinson_recursion,
+    _s_cg_solve,
 )
-from ..linear_algebra import _default_perm
 from ..types import Int
 from ..util import batch_computation
 from . import B, Numeric, dispatch
@@ -66,10 +61,24 @@ def svd(a: Numeric, compute_uv: bool = True):
     return (res[0], res[1], jnp.conj(transpose(res[2]))) if compute_uv else res
 
 
+@dispatch
+def svdvals(a: Numeric):
+    return jnp.linalg.svd(a, compute_uv=False)
+
+
 @dispatch
 def eig(a: Numeric, compute_eigvecs: bool = True):
-    vals, vecs = jnp.linalg.eig(a)
-    return (vals, vecs) if compute_eigvecs else vals
+    return jnp.linalg.eig(a) if compute_eigvecs else jnp.linalg.eigvals(a)
+
+
+@dispatch
+def eigvals(a: Numeric):
+    return jnp.linalg.eigvals(a)
+
+
+@dispatch
+def eigh(a: Numeric, compute_eigvecs: bool = True):
+    return jnp.linalg.eigh(a) if compute_eigvecs else jnp.linalg.eigvalsh(a)
 
 
 @dispatch
@@ -92,12 +101,9 @@ def logdet(a: Numeric):
     return jnp.linalg.slogdet(a)[1]
 
 
-_expm = jax_register(expm, i_expm, s_expm, i_s_expm)
-
-
 @dispatch
 def expm(a: Numeric):
-    return _expm(a)
+    return jsla.expm(a)
 
 
 _logm = jax_register(logm, i_logm, s_logm, i_s_logm)
@@ -113,6 +119,13 @@ def _cholesky(a: Numeric):
     return jnp.linalg.cholesky(a)
 
 
+@dispatch
+def _cholesky_ex(a: Numeric):
+    # JAX does not raise an exception, but fills failed decompositions with NaNs.
+    chol = jnp.linalg.cholesky(a)
+    return chol, np.any(np.isnan(np.asarray(chol)), axis=(-2, -1))
+
+
 @dispatch
 def cholesky_solve(a: Numeric, b: Numeric):
     return triangular_solve(transpose(a), triangular_solve(a, b), lower_a=False)
@@ -125,14 +138,39 @@ def triangular_solve(a: Numeric, b: Numeric, lower_a: bool = True):
             a_, b_, trans="N", lower=lower_a, check_finite=False
         )
 
-    return batch_computation(_triangular_solve, (a, b), (2, 2))
+    # JAX's triangular solve supports batch dimensions, as long as they are equal.
+    return batch_computation(
+        _triangular_solve, (a, b), (2, 2), vectorised=_triangular_solve
+    )
 
 
-_toeplitz_solve = jax_register(
-    toeplitz_solve, i_toeplitz_solve, s_toeplitz_solve, i_s_toeplitz_solve
-)
+@jax.jit
+def _levinson_recursion_jit(a, b, c):
+    return _levinson_recursion(a, b, c, fori_loop=jax.lax.fori_loop)
 
 
 @dispatch
 def toeplitz_solve(a: Numeric, b: Numeric, c: Numeric):
-    return _toeplitz_solve(a, b, c)
+    return _levinson_check(*_levinson_recursion_jit(a, b, c))
+
+
+@dispatch
+def _smallest_k(a: Numeric, k: Int):
+    return jax.lax.top_k(-a, k)[1]
+
+
+@dispatch
+def _cg_solve_implicit(a: Numeric, b: Numeric, solve: FunctionType):
+    @jax.custom_vjp
+    def _solve(a, b):
+        return solve(a, b)
+
+    def _solve_fwd(a, b):
+        x = solve(a, b)
+        return x, (x, a, b)
+
+    def _solve_bwd(res, s_x):
+        return _s_cg_solve(solve, s_x, *res)
+
+    _solve.defvjp(_solve_fwd, _solve_bwd)
+    return _solve(a, b)
@@ -0,0 +1,160 @@
+cimport numpy as np
+
+import numpy as np
+
+cimport cython
+from scipy.linalg.cython_lapack cimport (
+    dpotrf,
+    dpotri,
+    dpotrs,
+    dtrtrs,
+    spotrf,
+    spotri,
+    spotrs,
+    strtrs,
+)
+
+from cython.parallel import prange
+
+# All routines below operate in place on C-contiguous stacks of matrices and return
+# the LAPACK status of every matrix in the stack. LAPACK assumes column-major storage,
+# so a C-contiguous `n x n` matrix `a` is seen as `a^T`. For the solvers, the
+# right-hand sides must therefore be given in transposed form: `b[i]` is `k x n` and
+# holds the `n x k` right-hand side of the `i`th system in column-major order. The
+# solutions are written to `b`. The `i`th system uses the matrix `a[a_index[i]]`,
+# which allows broadcasting without copying `a`.
+
+ctypedef fused floating:
+    float
+    double
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def potrf(floating[:, :, ::1] a):
+    cdef int batch = a.shape[0]
+    cdef int n = a.shape[1]
+    cdef int i, j, k
+
+    # Initialise output.
+    cdef np.ndarray[int, ndim=1] info = np.zeros([batch], dtype=np.intc)
+    cdef int [:] info_view = info
+
+    # `a` is symmetric, so it is seen as itself. Computing the upper-triangular
+    # factor `u` with `a = u^T u` then gives the lower-triangular factor in the lower
+    # triangle of `a`.
+    cdef char uplo = b"U"
+
+    for i in prange(batch, nogil=True):
+        if floating is double:
+            dpotrf(&uplo, &n, &a[i, 0, 0], &n, &info_view[i])
+        else:
+            spotrf(&uplo, &n, &a[i, 0, 0], &n, &info_view[i])
+
+        # LAPACK leaves the other triangle untouched, so zero it.
+        for j in range(n):
+            for k in range(j + 1, n):
+                a[i, j, k] = 0
+
+    return info
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def potri(floating[:, :, ::1] a):
+    cdef int batch = a.shape[0]
+    cdef int n = a.shape[1]
+    cdef int i, j, k
+
+    # Initialise output.
+    cdef np.ndarray[int, ndim=1] info = np.zeros([batch], dtype=np.intc)
+    cdef int [:] info_view = info
+
+    # The lower-triangular factor `a` is seen as the upper-triangular factor `a^T`.
+    # LAPACK writes the lower triangle of the inverse to the lower triangle of `a`.
+    cdef char uplo = b"U"
+
+    if n == 0:
+        return info
+
+    for i in prange(batch, nogil=True):
+        if floating is double:
+            dpotri(&uplo, &n, &a[i, 0, 0], &n, &info_view[i])
+        else:
+            spotri(&uplo, &n, &a[i, 0, 0], &n, &info_view[i])
+
+        # The inverse is symmetric, so fill the upper triangle.
+        for j in range(n):
+            for k in range(j + 1, n):
+                a[i, j, k] = a[i, k, j]
+
+    return info
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def trtrs(const floating[:, :, ::1] a,
+          const np.int64_t[::1] a_index,
+          floating[:, :, ::1] b,
+          bint lower):
+    cdef int batch = b.shape[0]
+    cdef int n = b.shape[2]
+    cdef int nrhs = b.shape[1]
+    cdef int i
+
+    # Initialise output.
+    cdef np.ndarray[int, ndim=1] info = np.zeros([batch], dtype=np.intc)
+    cdef int [:] info_view = info
+
+    # `a` is seen as `a^T`, so flip the triangle and solve with the transpose.
+    cdef char uplo = b"U" if lower else b"L"
+    cdef char trans = b"T"
+    cdef char diag = b"N"
+
+    if n == 0:
+        return info
+
+    for i in prange(batch, nogil=True):
+        if floating is double:
+            dtrtrs(&uplo, &trans, &diag, &n, &nrhs,
+                   <double*> &a[a_index[i], 0, 0], &n,
+                   &b[i, 0, 0], &n, &info_view[i])
+        else:
+            strtrs(&uplo, &trans, &diag, &n, &nrhs,
+                   <float*> &a[a_index[i], 0, 0], &n,
+                   &b[i, 0, 0], &n, &info_view[i])
+
+    return info
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def potrs(const floating[:, :, ::1] a,
+          const np.int64_t[::1] a_index,
+          floating[:, :, ::1] b):
+    cdef int batch = b.shape[0]
+    cdef int n = b.shape[2]
+    cdef int nrhs = b.shape[1]
+    cdef int i
+
+    # Initialise output.
+    cdef np.ndarray[int, ndim=1] info = np.zeros([batch], dtype=np.intc)
+    cdef int [:] info_view = info
+
+    # The lower-triangular factor `a` is seen as the upper-triangular factor `a^T`.
+    cdef char uplo = b"U"
+
+    if n == 0:
+        return info
+
+    for i in prange(batch, nogil=True):
+        if floating is double:
+            dpotrs(&uplo, &n, &nrhs,
+                   <double*> &a[a_index[i], 0, 0], &n,
+                   &b[i, 0, 0], &n, &info_view[i])
+        else:
+            spotrs(&uplo, &n, &nrhs,
+                   <float*> &a[a_index[i], 0, 0], &n,
+                   &b[i, 0, 0], &n, &info_view[i])
+
+    return info
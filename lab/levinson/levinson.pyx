@@ -0,0 +1,126 @@
+cimport numpy as np
+
+import numpy as np
+
+cimport cython
+
+from cython.parallel import prange
+
+# Solve batches of Toeplitz systems with the Levinson recursion for general,
+# nonsymmetric Toeplitz matrices. The `i`th Toeplitz matrix has first column `a[i]`
+# and, except for the first element, first row `b[i]`. The right-hand sides are the
+# columns of `c[i]`. The inputs are only read, so they may be read-only buffers.
+
+ctypedef fused floating:
+    float
+    double
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef int _levinson(const floating[:, ::1] a,
+                   const floating[:, ::1] b,
+                   const floating[:, :, ::1] c,
+                   floating[:, :, ::1] x,
+                   floating[:, ::1] work,
+                   Py_ssize_t i) noexcept nogil:
+    cdef Py_ssize_t n = a.shape[1]
+    cdef Py_ssize_t k = c.shape[2]
+    cdef Py_ssize_t m, j, l, r, half
+    cdef floating x_den, g_den, g_num, h_num, num, g_m, h_m, g_j, g_r, h_j, h_r
+
+    # Let `vals[n - 1 + t]` be the element of the Toeplitz matrix on diagonal `-t`.
+    cdef floating* vals = &work[i, 0]
+    cdef floating* g = vals + 2 * n - 1
+    cdef floating* h = g + n
+
+    for j in range(n):
+        vals[n - 1 + j] = a[i, j]
+    for j in range(n - 1):
+        vals[n - 2 - j] = b[i, j]
+
+    if vals[n - 1] == 0:
+        return 1
+    for l in range(k):
+        x[i, 0, l] = c[i, 0, l] / vals[n - 1]
+    if n == 1:
+        return 0
+    g[0] = vals[n - 2] / vals[n - 1]
+    h[0] = vals[n] / vals[n - 1]
+
+    for m in range(1, n):
+        # Extend the solutions.
+        x_den = -vals[n - 1]
+        for j in range(m):
+            x_den = x_den + vals[n + m - j - 1] * g[m - j - 1]
+        if x_den == 0:
+            return 1
+        for l in range(k):
+            num = -c[i, m, l]
+            for j in range(m):
+                num = num + vals[n + m - j - 1] * x[i, j, l]
+            x[i, m, l] = num / x_den
+            for j in range(m):
+                x[i, j, l] = x[i, j, l] - x[i, m, l] * g[m - j - 1]
+        if m == n - 1:
+            break
+
+        # Extend the forward and backward vectors.
+        g_num = -vals[n - m - 2]
+        h_num = -vals[n + m]
+        g_den = -vals[n - 1]
+        for j in range(m):
+            g_num = g_num + vals[n + j - m - 1] * g[j]
+            h_num = h_num + vals[n + m - j - 1] * h[j]
+            g_den = g_den + vals[n + j - m - 1] * h[m - j - 1]
+        if g_den == 0:
+            return 1
+        g_m = g_num / g_den
+        h_m = h_num / x_den
+        g[m] = g_m
+        h[m] = h_m
+        r = m - 1
+        half = (m + 1) // 2
+        for j in range(half):
+            g_j = g[j]
+            g_r = g[r]
+            h_j = h[j]
+            h_r = h[r]
+            g[j] = g_j - g_m * h_r
+            g[r] = g_r - g_m * h_j
+            h[j] = h_j - h_m * g_r
+            h[r] = h_r - h_m * g_j
+            r = r - 1
+
+    return 0
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def levinson(const floating[:, ::1] a,
+             const floating[:, ::1] b,
+             const floating[:, :, ::1] c):
+    cdef Py_ssize_t batch = c.shape[0]
+    cdef Py_ssize_t n = c.shape[1]
+    cdef Py_ssize_t k = c.shape[2]
+    cdef Py_ssize_t i
+
+    # Initialise output.
+    dtype = np.float64 if floating is double else np.float32
+    x = np.empty([batch, n, k], dtype=dtype)
+    cdef floating[:, :, ::1] x_view = x
+    cdef np.ndarray[int, ndim=1] info = np.zeros([batch], dtype=np.intc)
+    cdef int [:] info_view = info
+
+    if n == 0:
+        return x, info
+
+    # Every system needs its own work space.
+    work = np.empty([batch, 4 * n - 1], dtype=dtype)
+    cdef floating[:, ::1] work_view = work
+
+    for i in prange(batch, nogil=True):
+        info_view[i] = _levinson(a, b, c, x_view, work_view, i)
+
+    return x, info
@@ -1,10 +1,15 @@
 import logging
+import sys
 import warnings
+from types import FunctionType
 from typing import Optional, Union
 
+import numpy as np
+from plum import convert
+
 from . import B, dispatch
-from .types import Int, Numeric
-from .util import abstract
+from .types import Int, NPDType, Numeric, RandomState, _convert_back
+from .util import abstract, compress_batch
 
 __all__ = [
     "epsilon",
@@ -16,9 +21,16 @@ __all__ = [
     "dot",
     "einsum",
     "kron",
+    "kron_matmul",
+    "kron_solve",
+    "kron_logdet",
     "trace",
     "svd",
     "eig",
+    "eigvals",
+    "eigh",
+    "eigvalsh",
+    "svdvals",
     "solve",
     "inv",
     "pinv",
@@ -27,17 +39,42 @@ __all__ = [
     "expm",
     "logm",
     "cholesky_retry_factor",
+    "CholeskyJitterCache",
     "cholesky",
     "chol",
     "cholesky_solve",
     "cholsolve",
+    "cholesky_inverse",
+    "solve_pd",
+    "inv_pd",
+    "logdet_pd",
+    "solve_refined",
+    "solve_pd_refined",
     "triangular_solve",
     "trisolve",
+    "CholeskyFactor",
+    "cholesky_factor",
+    "cholesky_update",
+    "cholesky_append",
+    "cholesky_remove",
+    "pivoted_cholesky",
+    "nystrom",
+    "lowrank_solve",
+    "lowrank_logdet",
     "toeplitz_solve",
     "toepsolve",
+    "toeplitz_matmul",
+    "cg_solve",
+    "trace_estimate",
+    "logdet_estimate",
+    "randomized_svd",
+    "eigh_topk",
     "outer",
     "reg",
     "pw_dists2",
+    "pw_dists2_blocks",
+    "knn",
+    "pw_metric",
     "pw_dists",
     "ew_dists2",
     "ew_dists",
@@ -190,6 +227,91 @@ def kron(a: Numeric, b: Numeric, *indices: Int):
     return B.reshape(B.multiply(a[a_indices], b[b_indices]), *target_shape)
 
 
+def _kron_apply(f, factors, x):
+    """Apply a function factor-wise to a matrix multiplied by a Kronecker product
+    without constructing the Kronecker product.
+
+    Args:
+        f (function): Function which takes in a factor and a matrix and applies the
+            factor to the matrix.
+        factors (tuple[matrix] or list[matrix]): Factors of the Kronecker product.
+        x (tensor): Vector, matrix, or batch of matrices to apply the function to.
+
+    Returns:
+        tensor: Result.
+    """
+    rank = B.rank(x)
+    if rank == 1:
+        return _kron_apply(f, factors, x[:, None])[:, 0]
+    elif rank > 2:
+        # Fold the batch dimensions into the columns.
+        batch_shape = tuple(int(d) for d in B.shape(x)[:-2])
+        k = int(B.shape(x, -1))
+        perm = (rank - 2,) + tuple(range(rank - 2)) + (rank - 1,)
+        x = B.reshape(B.transpose(x, perm=perm), int(B.shape(x, -2)), -1)
+        res = B.reshape(_kron_apply(f, factors, x), -1, *batch_shape, k)
+        perm = tuple(range(1, rank - 1)) + (0, rank - 1)
+        return B.transpose(res, perm=perm)
+
+    k = int(B.shape(x, 1))
+    for factor in factors:
+        # Bring the index of the current factor to the front, apply the factor, and
+        # move the resulting index to the back. After all factors have been applied,
+        # the indices are again in the original order, but preceded by the index of
+        # the columns of `x`.
+        x = B.reshape(x, int(B.shape(factor, 1)), -1)
+        x = B.reshape(B.transpose(f(factor, x)), -1)
+    return B.transpose(B.reshape(x, k, -1))
+
+
+@dispatch
+def kron_matmul(factors: Union[tuple, list], x: Numeric):
+    """Multiply a matrix by a Kronecker product without constructing the Kronecker
+    product.
+
+    Args:
+        factors (tuple[matrix] or list[matrix]): Factors of the Kronecker product.
+        x (tensor): Vector, matrix, or batch of matrices to multiply.
+
+    Returns:
+        tensor: Product of the Kronecker product and `x`.
+    """
+    return _kron_apply(matmul, factors, x)
+
+
+@dispatch
+def kron_solve(factors: Union[tuple, list], x: Numeric):
+    """Solve a linear system with a Kronecker product without constructing the
+    Kronecker product.
+
+    Args:
+        factors (tuple[matrix] or list[matrix]): Factors of the Kronecker product.
+            Must be square.
+        x (tensor): RHS. Can be a vector, matrix, or batch of matrices.
+
+    Returns:
+        tensor: Solution.
+    """
+    return _kron_apply(solve, factors, x)
+
+
+@dispatch
+def kron_logdet(factors: Union[tuple, list]):
+    """Compute the log-determinant of a Kronecker product without constructing the
+    Kronecker product.
+
+    Args:
+        factors (tuple[matrix] or list[matrix]): Factors of the Kronecker product.
+            Must be square.
+
+    Returns:
+        scalar: Log-determinant of the Kronecker product.
+    """
+    sizes = [int(B.shape(factor, 0)) for factor in factors]
+    total = np.prod(sizes)
+    return sum(total // n * logdet(factor) for n, factor in zip(sizes, factors))
+
+
 @dispatch
 @abstract()
 def svd(a: Numeric, compute_uv: bool = True):  # pragma: no cover
@@ -205,6 +327,19 @@ def svd(a: Numeric, compute_uv: bool = True):  # pragma: no cover
     """
 
 
+@dispatch
+@abstract()
+def svdvals(a: Numeric):  # pragma: no cover
+    """Compute the singular values without computing the singular vectors.
+
+    Args:
+        a (tensor): Matrix to decompose.
+
+    Returns:
+        tensor: Singular values in decreasing order.
+    """
+
+
 @dispatch
 @abstract()
 def eig(a: Numeric, compute_eigvecs: bool = True):  # pragma: no cover
@@ -219,6 +354,50 @@ def eig(a: Numeric, compute_eigvecs: bool = True):  # pragma: no cover
     """
 
 
+@dispatch
+@abstract()
+def eigvals(a: Numeric):  # pragma: no cover
+    """Compute the eigenvalues without computing the eigenvectors.
+
+    Args:
+        a (tensor): Matrix to decompose.
+
+    Returns:
+        tensor: Eigenvalues.
+    """
+
+
+@dispatch
+@abstract()
+def eigh(a: Numeric, compute_eigvecs: bool = True):  # pragma: no cover
+    """Compute the eigenvalue decomposition of a symmetric matrix. Only the lower
+    triangle of `a` is used.
+
+    Args:
+        a (tensor): Symmetric matrix to decompose.
+        compute_eigvecs (bool, optional): Also compute eigenvectors. Defaults to `True`.
+
+    Returns:
+        tuple: `(S, V)` if `compute_eigvecs` is `True` and just `S` otherwise. The
+            eigenvalues are real and in increasing order.
+    """
+
+
+@dispatch
+def eigvalsh(a: Numeric):
+    """Compute the eigenvalues of a symmetric matrix without computing the
+    eigenvectors. The backends access different parts of `a`, so `a` must be
+    symmetric.
+
+    Args:
+        a (tensor): Symmetric matrix to decompose.
+
+    Returns:
+        tensor: Eigenvalues in increasing order.
+    """
+    return eigh(a, compute_eigvecs=False)
+
+
 @dispatch
 @abstract(promote=2)
 def solve(a, b):  # pragma: no cover
@@ -321,36 +500,198 @@ cholesky_retry_factor = 1
 this at most factor and try the Cholesky decomposition again."""
 
 
+class CholeskyJitterCache:
+    """A context which remembers the regularisation for which :func:`.cholesky`
+    succeeded, so that subsequent decompositions start from that regularisation rather
+    than from `B.epsilon`.
+
+    Decompositions are identified by the keyword argument `jitter_key` of
+    :func:`.cholesky` or, if that is not given, by the place where :func:`.cholesky` is
+    called.
+
+    Args:
+        decay (int, optional): If this many consecutive decompositions succeed without
+            retrying, decrease the remembered regularisation by a factor ten. Defaults
+            to `10`.
+
+    Attributes:
+        active (:class:`.linear_algebra.CholeskyJitterCache` or None): Cache which is
+            currently active.
+        hits (int): Number of matrices for which the decomposition started from a
+            regularisation larger than `B.epsilon`.
+        avoided (int): Number of failed decompositions of matrices that were avoided.
+    """
+
+    active = None
+
+    def __init__(self, decay=10):
+        self.decay = decay
+        self.hits = 0
+        self.avoided = 0
+        self._exponents = {}
+        self._successes = {}
+        self._previous_active = None
+
+    def __enter__(self):
+        self._previous_active = CholeskyJitterCache.active
+        CholeskyJitterCache.active = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        CholeskyJitterCache.active = self._previous_active
+
+    def start(self, key, n):
+        """Get the regularisation to start decompositions from.
+
+        Args:
+            key (object): Key of the decompositions.
+            n (int): Number of matrices.
+
+        Returns:
+            np.ndarray: Powers of ten to multiply `B.epsilon` by for every matrix.
+        """
+        exponents = self._exponents.get(key, np.zeros(n, dtype=int))
+        if len(exponents) != n:
+            # The batch shape changed, so be conservative.
+            exponents = np.full(n, np.max(exponents))
+        self.hits += int(np.sum(exponents > 0))
+        self.avoided += int(np.sum(exponents))
+        return exponents.copy()
+
+    def update(self, key, start, exponents):
+        """Update the regularisation to start decompositions from.
+
+        Args:
+            key (object): Key of the decompositions.
+            start (np.ndarray): Powers of ten that the decompositions started from.
+            exponents (np.ndarray): Powers of ten for which the decompositions
+                succeeded.
+        """
+        if np.array_equal(start, exponents):
+            self._successes[key] = self._successes.get(key, 0) + 1
+            if self._successes[key] >= self.decay:
+                exponents = np.maximum(exponents - 1, 0)
+                self._successes[key] = 0
+        else:
+            self._successes[key] = 0
+        self._exponents[key] = exponents
+
+    def __str__(self):
+        return repr(self)
+
+    def __repr__(self):
+        return f"<CholeskyJitterCache: hits={self.hits}, avoided={self.avoided}>"
+
+
+def _call_site():
+    """Find the place outside of LAB and Plum where a function was called.
+
+    Returns:
+        tuple[str, int]: File name and line number.
+    """
+    frame = sys._getframe(1)
+    while frame.f_back is not None and frame.f_globals.get("__name__", "").split(".")[
+        0
+    ] in {"lab", "plum"}:
+        frame = frame.f_back
+    return frame.f_code.co_filename, frame.f_lineno
+
+
+def _reg_exponents(a, exponents):
+    """Regularise a batch of matrices with `B.epsilon` times a power of ten.
+
+    Args:
+        a (tensor): Batch of matrices with exactly one batch dimension.
+        exponents (np.ndarray): Power of ten for every matrix.
+
+    Returns:
+        tensor: Regularised matrices.
+    """
+    if np.all(exponents == exponents[0]):
+        return reg(a, diag=10.0 ** exponents[0] * B.epsilon)
+    else:
+        diag = B.cast(B.dtype(a), 10.0**exponents * B.epsilon)
+        return reg(a, diag=diag[:, None, None])
+
+
 @dispatch
-def cholesky(a: Numeric):
+def cholesky(a: Numeric, return_jitter: bool = False, jitter_key=None):
     """Compute the Cholesky decomposition. The matrix will automatically be regularised
     because computing the decomposition.
 
+    For a batch of matrices, the regularisation is only increased for the matrices
+    for which the decomposition fails. Within a
+    :class:`.linear_algebra.CholeskyJitterCache`, the decomposition starts from the
+    regularisation for which it previously succeeded.
+
     Args:
         a (tensor): Matrix to decompose.
+        return_jitter (bool, optional): Also return the regularisation that was
+            applied to every matrix in the batch. Defaults to `False`.
+        jitter_key (object, optional): Key to identify the decomposition by in a
+            :class:`.linear_algebra.CholeskyJitterCache`. Defaults to the place where
+            the function is called.
 
     Returns:
         tensor: Cholesky decomposition.
+        tensor: If `return_jitter` is `True`, the regularisation applied to every
+            matrix. This tensor has the batch shape of `a`.
     """
-    factor = 1
-    while True:
-        try:
-            return _cholesky(reg(a, diag=factor * B.epsilon))
-        except Exception as e:
-            if factor < B.cholesky_retry_factor:
-                # If we can still increase the factor, increase it and retry the
-                # Cholesky.
-                factor *= 10
-                warnings.warn(
-                    f"Cholesky decomposition failed. "
-                    f"Trying again with regularisation `{factor * B.epsilon}`.",
-                    stacklevel=2,
-                )
-                continue
-            else:
-                # We have increased the factor as much as we're allowed to. Throw
-                # the original exception.
-                raise e
+    batch_shape = B.shape(a)[:-2]
+
+    # If `a` is abstract, then failures cannot be detected.
+    if B.isabstract(a):
+        chol = _cholesky(reg(a))
+        if return_jitter:
+            return chol, B.epsilon * B.ones(B.dtype(a), *batch_shape)
+        else:
+            return chol
+
+    a, uncompress = compress_batch(a, 2)
+    n = int(B.shape(a, 0))
+
+    cache = CholeskyJitterCache.active
+    if cache is not None:
+        if jitter_key is None:
+            jitter_key = _call_site()
+        start = cache.start(jitter_key, n)
+    else:
+        start = np.zeros(n, dtype=int)
+    exponents = start.copy()
+
+    chol, failed = _cholesky_ex(_reg_exponents(a, exponents))
+    failed = np.flatnonzero(failed)
+    while len(failed) > 0:
+        a_failed = B.take(a, failed, axis=0)
+        if np.any(10.0 ** exponents[failed] >= B.cholesky_retry_factor):
+            # We have increased the regularisation as much as we're allowed to. Throw
+            # the error of the framework.
+            _cholesky(_reg_exponents(a_failed, exponents[failed]))
+            break
+        # We can still increase the regularisation, so increase it and retry the
+        # Cholesky for the matrices for which it failed.
+        exponents[failed] += 1
+        warnings.warn(
+            f"Cholesky decomposition failed for {len(failed)} of {n} matrices. "
+            f"Trying again with regularisation "
+            f"`{10.0 ** np.max(exponents[failed]) * B.epsilon}`.",
+            stacklevel=2,
+        )
+        chol_failed, still_failed = _cholesky_ex(
+            _reg_exponents(a_failed, exponents[failed])
+        )
+        chol = _replace_batch_elements(chol, failed, chol_failed)
+        failed = failed[still_failed]
+
+    if cache is not None:
+        cache.update(jitter_key, start, exponents)
+
+    chol = uncompress(chol)
+    if return_jitter:
+        jitter = B.reshape(10.0**exponents * B.epsilon, *batch_shape)
+        return chol, B.cast(B.dtype(chol), jitter)
+    else:
+        return chol
 
 
 chol = cholesky  #: Shorthand for `cholesky`.
@@ -362,6 +703,52 @@ def _cholesky(a: Numeric):  # pragma: no cover
     pass
 
 
+@dispatch
+def _cholesky_ex(a: Numeric):
+    """Compute the Cholesky decompositions of a batch of matrices and determine for
+    which matrices the decomposition failed.
+
+    Args:
+        a (tensor): Batch of matrices with exactly one batch dimension.
+
+    Returns:
+        tensor: Cholesky decompositions. The decompositions that failed have arbitrary
+            values.
+        np.ndarray: Boolean array indicating for which matrices the decomposition
+            failed.
+    """
+    try:
+        return _cholesky(a), np.zeros(int(B.shape(a, 0)), dtype=bool)
+    except Exception:
+        # Find out for which matrices the decomposition failed.
+        chols, failed = [], []
+        for i in range(int(B.shape(a, 0))):
+            try:
+                chols.append(_cholesky(a[i]))
+                failed.append(False)
+            except Exception:
+                chols.append(B.zeros(a[i]))
+                failed.append(True)
+        return B.stack(*chols, axis=0), np.array(failed, dtype=bool)
+
+
+def _replace_batch_elements(a, indices, replacements):
+    """Replace elements of a batch in a way that works for all frameworks.
+
+    Args:
+        a (tensor): Batch with exactly one batch dimension.
+        indices (np.ndarray): Indices of the elements to replace.
+        replacements (tensor): Replacements for the elements.
+
+    Returns:
+        tensor: `a` with the elements at `indices` replaced by `replacements`.
+    """
+    n = int(B.shape(a, 0))
+    perm = np.arange(n)
+    perm[indices] = n + np.arange(len(indices))
+    return B.take(B.concat(a, replacements, axis=0), perm, axis=0)
+
+
 @dispatch
 @abstract(promote=2)
 def cholesky_solve(a, b):  # pragma: no cover
@@ -381,179 +768,1713 @@ cholsolve = cholesky_solve  #: Shorthand for `cholesky_solve`.
 
 
 @dispatch
-@abstract(promote=2)
-def triangular_solve(a, b, lower_a: bool = True):  # pragma: no cover
-    """Solve the linear system `a x = b` where `a` is triangular.
+def cholesky_inverse(a: Numeric):
+    """Compute the inverse of a matrix given its Cholesky factorisation.
 
     Args:
-        a (tensor): Triangular matrix `a`.
-        b (tensor): RHS `b`.
-        lower_a (bool, optional): Indicate that `a` is lower triangular
-            instead of upper triangular. Defaults to `True`.
+        a (tensor): Cholesky factorisation of the matrix.
 
     Returns:
-        tensor: Solution `x`.
+        tensor: Inverse of the matrix.
     """
-
-
-trisolve = triangular_solve  #: Shorthand for `triangular_solve`.
+    return cholesky_solve(a, B.eye(a))
 
 
 @dispatch
-@abstract(promote=3)
-def toeplitz_solve(a, b, c):  # pragma: no cover
-    """Solve the linear system `toep(a, b) x = c` where `toep(a, b)` is a
-    Toeplitz matrix.
+def solve_pd(a, b):
+    """Solve the linear system `a x = b` where `a` is positive definite. This uses a
+    Cholesky decomposition rather than an LU decomposition, which is about twice as
+    cheap and numerically more stable. `a` is regularised like in :func:`.cholesky`.
 
     Args:
-        a (tensor): First column of the Toeplitz matrix.
-        b (tensor, optional): *Except for the first element*, first row of the
-            Toeplitz matrix. Defaults to `a[1:]`.
-        c (tensor): RHS `c`.
+        a (tensor): Positive-definite LHS `a`.
+        b (tensor): RHS `b`.
 
     Returns:
         tensor: Solution `x`.
     """
+    return cholesky_solve(cholesky(a), b)
 
 
 @dispatch
-def toeplitz_solve(a, c):
-    return toeplitz_solve(a, a[1:], c)
-
-
-toepsolve = toeplitz_solve  #: Shorthand for `toeplitz_solve`.
+def inv_pd(a):
+    """Compute the inverse of a positive-definite matrix `a` via a Cholesky
+    decomposition. `a` is regularised like in :func:`.cholesky`.
 
+    Args:
+        a (tensor): Positive-definite matrix to compute inverse of.
 
-def _a_b_uprank(a, b):
-    a = B.uprank(a)
-    b = B.uprank(b)
-    return a, b
+    Returns:
+        tensor: Inverse of `a`.
+    """
+    return cholesky_inverse(cholesky(a))
 
 
 @dispatch
-def outer(a, b):
-    """Compute the outer product between two vectors or matrices.
+def logdet_pd(a):
+    """Compute the log-determinant of a positive-definite matrix `a` via a Cholesky
+    decomposition. `a` is regularised like in :func:`.cholesky`.
 
     Args:
-        a (tensor): First tensor.
-        b (tensor): Second tensor.
+        a (tensor): Positive-definite matrix to compute log-determinant of.
 
     Returns:
-        tensor: Outer product of `a` and `b`.
+        scalar: Log-determinant of `a`.
     """
-    a, b = _a_b_uprank(a, b)
+    return 2 * B.sum(B.log(B.diag_extract(cholesky(a))), axis=-1)
 
-    # Optimise the case that both are column vectors.
-    if B.shape(a, -1) == 1 and B.shape(b, -1) == 1:
-        return a * B.transpose(b)
 
-    return B.matmul(a, b, tr_b=True)
+def _solve_refined(a, b, factorise, factor_dtype, target_dtype, iters):
+    """Solve `a x = b` by factorising `a` in low precision and refining the solution
+    with residuals computed in high precision.
 
+    Args:
+        a (tensor): LHS `a`.
+        b (tensor): RHS `b`.
+        factorise (function): Function which takes in `a` in low precision and returns
+            a function which solves `a x = r` for a given `r` in low precision.
+        factor_dtype (dtype or None): Low precision. `None` means single precision.
+        target_dtype (dtype or None): High precision. `None` means the data type of
+            `a` and `b`.
+        iters (int): Number of refinement steps.
 
-@dispatch
-def outer(a):
-    return outer(a, a)
+    Returns:
+        tensor: Solution `x`.
+    """
+    ref_dtype = B.dtype(a)
+    if target_dtype is None:
+        target_dtype = B.dtype(a, b)
+    if factor_dtype is None:
+        factor_dtype = np.float32
+    # Allow data types to be given for any framework.
+    target_dtype = _convert_back(convert(target_dtype, NPDType), ref_dtype)
+    factor_dtype = _convert_back(convert(factor_dtype, NPDType), ref_dtype)
+
+    a = B.cast(target_dtype, a)
+    b = B.cast(target_dtype, b)
+    solve_low = factorise(B.cast(factor_dtype, a))
+
+    def correction(r):
+        return B.cast(target_dtype, solve_low(B.cast(factor_dtype, r)))
+
+    x = correction(b)
+    for _ in range(iters):
+        x = B.add(x, correction(B.subtract(b, B.matmul(a, x))))
+    return x
 
 
 @dispatch
-def reg(a, diag=None, clip: bool = True):
-    """Add a diagonal to a matrix.
+def solve_refined(
+    a,
+    b,
+    factor_dtype=None,
+    target_dtype=None,
+    iters: Int = 3,
+):
+    """Solve the linear system `a x = b` with mixed precision. `a` is inverted in
+    low precision, and the solution is then refined with residuals computed in high
+    precision. This attains the accuracy of the high precision as long as `a` is not
+    too ill-conditioned for the low precision.
 
     Args:
-        a (matrix): Matrix to add a diagonal to.
-        diag (float, optional): Magnitude of the diagonal to add. Defaults to
-            `.linear_algebra.epsilon`.
-        clip (bool, optional): Let `diag` be at least `.linear_algebra.epsilon`.
-            Defaults to `True`.
+        a (tensor): LHS `a`.
+        b (tensor): RHS `b`.
+        factor_dtype (dtype, optional): Precision to invert `a` in. Defaults to
+            single precision.
+        target_dtype (dtype, optional): Precision of the solution. Defaults to the
+            data type of `a` and `b`.
+        iters (int, optional): Number of refinement steps. Defaults to `3`.
 
     Returns:
-        matrix: Regularised version of `a`.
+        tensor: Solution `x`.
     """
-    # Careful to use `B.epsilon` here and not `epsilon`! Otherwise, changes
-    # will not be tracked.
-    if diag is None:
-        diag = B.epsilon
-    if clip and diag is not B.epsilon:
-        diag = B.maximum(diag, B.epsilon)
-    return a + diag * B.eye(a)
+
+    def factorise(a_low):
+        a_inv = inv(a_low)
+        return lambda r: matmul(a_inv, r)
+
+    return _solve_refined(a, b, factorise, factor_dtype, target_dtype, iters)
 
 
 @dispatch
-def pw_dists2(a, b):
-    """Compute the square the Euclidean norm of the pairwise differences between two
-    matrices where rows correspond to elements and columns to features.
+def solve_pd_refined(
+    a,
+    b,
+    factor_dtype=None,
+    target_dtype=None,
+    iters: Int = 3,
+):
+    """Like :func:`.solve_refined`, but for positive-definite `a`, which is
+    factorised with a Cholesky decomposition in low precision.
 
     Args:
-        a (matrix): First matrix.
-        b (matrix, optional): Second matrix. Defaults to `a`.
+        a (tensor): Positive-definite LHS `a`.
+        b (tensor): RHS `b`.
+        factor_dtype (dtype, optional): Precision to factorise `a` in. Defaults to
+            single precision.
+        target_dtype (dtype, optional): Precision of the solution. Defaults to the
+            data type of `a` and `b`.
+        iters (int, optional): Number of refinement steps. Defaults to `3`.
 
     Returns:
-        matrix: Square of the Euclidean norm of the pairwise differences
-            between the elements of `a` and `b`.
+        tensor: Solution `x`.
     """
-    a, b = _a_b_uprank(a, b)
 
-    # Optimise the one-dimensional case.
-    if B.shape(a, -1) == 1 and B.shape(b, -1) == 1:
-        return (a - B.transpose(b)) ** 2
+    def factorise(a_low):
+        chol = cholesky(a_low)
+        return lambda r: cholesky_solve(chol, r)
 
-    norms_a = B.sum(a**2, axis=-1)[..., :, None]
-    norms_b = B.sum(b**2, axis=-1)[..., None, :]
-    return norms_a + norms_b - 2 * B.matmul(a, b, tr_b=True)
+    return _solve_refined(a, b, factorise, factor_dtype, target_dtype, iters)
 
 
 @dispatch
-def pw_dists2(a):
-    return pw_dists2(a, a)
+@abstract(promote=2)
+def triangular_solve(a, b, lower_a: bool = True):  # pragma: no cover
+    """Solve the linear system `a x = b` where `a` is triangular.
 
+    Args:
+        a (tensor): Triangular matrix `a`.
+        b (tensor): RHS `b`.
+        lower_a (bool, optional): Indicate that `a` is lower triangular
+            instead of upper triangular. Defaults to `True`.
 
-@dispatch
-def pw_dists(a, b):
-    """Compute the Euclidean norm of the pairwise differences between two matrices
-    where rows correspond to elements and columns to features.
+    Returns:
+        tensor: Solution `x`.
+    """
+
+
+trisolve = triangular_solve  #: Shorthand for `triangular_solve`.
+
+
+class CholeskyFactor:
+    """Cholesky factorisation of a positive-definite matrix, which lazily computes
+    and caches quantities derived from the factorisation.
 
     Args:
-        a (matrix): First matrix.
-        b (matrix, optional): Second matrix. Defaults to `a`.
+        a (tensor): Matrix or batch of matrices to factorise.
+        **kw_args: Further keyword arguments are passed to :func:`.cholesky`.
 
-    Returns:
-        matrix: Euclidean norm of the pairwise differences between the
-            elements of `a` and `b`.
+    Attributes:
+        a (tensor): Matrix or batch of matrices which is factorised.
     """
-    a, b = _a_b_uprank(a, b)
 
-    # Optimise the one-dimensional case.
-    if B.shape(a, -1) == 1 and B.shape(b, -1) == 1:
-        return B.abs(a - B.transpose(b))
+    def __init__(self, a, **kw_args):
+        self.a = a
+        self._kw_args = kw_args
+        self._chol = None
+        self._logdet = None
+        self._inv = None
+
+    @property
+    def chol(self):
+        """tensor: Lower-triangular Cholesky factor."""
+        if self._chol is None:
+            self._chol = cholesky(self.a, **self._kw_args)
+        return self._chol
+
+    def solve(self, b):
+        """Solve the linear system `a x = b`.
+
+        Args:
+            b (tensor): RHS `b`.
+
+        Returns:
+            tensor: Solution `x`.
+        """
+        return cholesky_solve(self.chol, b)
+
+    def logdet(self):
+        """Compute the log-determinant of `a`.
+
+        Returns:
+            tensor: Log-determinant of `a`.
+        """
+        if self._logdet is None:
+            diag = B.diag_extract(self.chol)
+            self._logdet = 2 * B.sum(B.log(diag), axis=-1)
+        return self._logdet
+
+    def inv(self):
+        """Compute the inverse of `a`.
+
+        Returns:
+            tensor: Inverse of `a`.
+        """
+        if self._inv is None:
+            self._inv = cholesky_inverse(self.chol)
+        return self._inv
+
+    def quad_form(self, x, y=None):
+        """Compute the quadratic form `x^T inv(a) y`.
+
+        Args:
+            x (tensor): Left argument `x`.
+            y (tensor, optional): Right argument `y`. Defaults to `x`.
+
+        Returns:
+            tensor: Quadratic form.
+        """
+        iL_x = triangular_solve(self.chol, x)
+        if y is None:
+            iL_y = iL_x
+        else:
+            iL_y = triangular_solve(self.chol, y)
+        return matmul(iL_x, iL_y, tr_a=True)
 
-    return B.sqrt(B.maximum(B.pw_dists2(a, b), B.cast(B.dtype(a), 1e-30)))
+    def matmul(self, x):
+        """Multiply `a` with `x`.
+
+        Args:
+            x (tensor): Tensor to multiply with.
+
+        Returns:
+            tensor: Product `a x`.
+        """
+        return matmul(self.a, x)
+
+    def sample(self, *args):
+        """Sample from a Gaussian with mean zero and covariance `a`.
+
+        Args:
+            state (random state, optional): Random state.
+            num (int, optional): Number of samples. Defaults to `1`.
+
+        Returns:
+            state (random state, optional): Random state.
+            tensor: Samples as columns.
+        """
+        return _cholesky_factor_sample(self.chol, *args)
 
 
 @dispatch
-def pw_dists(a):
-    return pw_dists(a, a)
+def _cholesky_factor_sample(chol: Numeric, state: RandomState, num: Int = 1):
+    state, noise = B.randn(state, B.dtype(chol), *B.shape(chol)[:-1], num)
+    return state, matmul(chol, noise)
 
 
 @dispatch
-def ew_dists2(a, b):
-    """Compute the square the Euclidean norm of the element-wise differences between
-    two matrices where rows correspond to elements and columns to features.
+def _cholesky_factor_sample(chol: Numeric, num: Int = 1):
+    noise = B.randn(B.dtype(chol), *B.shape(chol)[:-1], num)
+    return matmul(chol, noise)
+
+
+def cholesky_factor(a, **kw_args):
+    """Compute the Cholesky factorisation of a positive-definite matrix, which can
+    then be reused to solve, compute the log-determinant, invert, et cetera.
 
     Args:
-        a (matrix): First matrix.
-        b (matrix, optional): Second matrix. Defaults to `a`.
+        a (tensor): Matrix or batch of matrices to factorise.
+        **kw_args: Further keyword arguments are passed to :func:`.cholesky`.
 
     Returns:
-        matrix: Square of the Euclidean norm of the element-wise differences
-            between the elements of `a` and `b`.
+        :class:`.linear_algebra.CholeskyFactor`: Factorisation.
     """
-    a, b = _a_b_uprank(a, b)
-    return B.sum((a - b) ** 2, axis=-1)[..., :, None]
+    return CholeskyFactor(a, **kw_args)
 
 
 @dispatch
-def ew_dists2(a):
-    return ew_dists2(a, a)
+def cholesky_update(a: Numeric, v: Numeric, downdate: bool = False):
+    """Given the Cholesky factorisation `a` of a matrix `k`, compute the Cholesky
+    factorisation of `k + v v^T` or `k - v v^T` in `O(n^2 r)` rather than `O(n^3)`
+    time, where `r` is the rank of the update.
+
+    Args:
+        a (tensor): Cholesky factorisation of `k`.
+        v (tensor): Vector for a rank-one update or matrix whose columns are the
+            vectors for a rank-`r` update. Batch dimensions of `a` and `v` are
+            broadcasted. If `v` has one dimension fewer than `a` and its last
+            dimension has the size of `a`, then `v` is a batch of vectors.
+        downdate (bool, optional): Compute the factorisation of `k - v v^T` instead of
+            `k + v v^T`. If `k - v v^T` is not positive definite, the result will
+            contain NaNs. Defaults to `False`.
+
+    Returns:
+        tensor: Cholesky factorisation of `k + v v^T` or `k - v v^T`.
+    """
+    sign = -1 if downdate else 1
+    dtype = B.dtype(a)
+    n = int(B.shape(a, -1))
+    indices = np.arange(n)
+
+    if B.rank(v) == 1 or (B.rank(v) == B.rank(a) - 1 and int(B.shape(v, -1)) == n):
+        v = B.expand_dims(v, axis=-1)
+    if int(B.shape(v, -2)) != n:
+        raise ValueError(
+            f"Cannot update a factor of size {n} with vectors of size "
+            f"{int(B.shape(v, -2))}."
+        )
+
+    for k in range(int(B.shape(v, -1))):
+        x = v[..., :, k]
+        cols = []
+        for j in range(n):
+            col = a[..., :, j]
+            col_j = col[..., j : j + 1]
+            x_j = x[..., j : j + 1]
+            r = B.sqrt(col_j * col_j + sign * x_j * x_j)
+            c = r / col_j
+            s = x_j / col_j
+            # Only the elements below the diagonal change. The diagonal becomes `r`.
+            below = B.cast(dtype, indices > j)
+            on = B.cast(dtype, indices == j)
+            col = below * (col + sign * s * x) / c + on * r
+            x = c * x - s * col
+            cols.append(col)
+        a = B.stack(*cols, axis=-1)
+
+    return a
+
+
+@dispatch
+def cholesky_append(a: Numeric, k_cross: Numeric, k_diag: Numeric):
+    """Given the Cholesky factorisation `a` of a matrix `k`, compute the Cholesky
+    factorisation of `k` extended with new rows and columns in `O(n^2 m)` rather than
+    `O((n + m)^3)` time, where `m` is the number of new rows and columns.
+
+    The new diagonal block is regularised in the same way as in :func:`.cholesky`.
+
+    Args:
+        a (tensor): Cholesky factorisation of `k`.
+        k_cross (tensor): Covariances between the existing and new rows and columns.
+            Must be of shape `(n, m)`.
+        k_diag (tensor): Covariances between the new rows and columns. Must be of
+            shape `(m, m)`.
+
+    Returns:
+        tensor: Cholesky factorisation of the extended matrix.
+    """
+    l21_t = triangular_solve(a, k_cross)
+    l22 = cholesky(k_diag - matmul(l21_t, l21_t, tr_a=True))
+    top = B.concat(a, B.zeros(k_cross), axis=-1)
+    bottom = B.concat(B.transpose(l21_t), l22, axis=-1)
+    return B.concat(top, bottom, axis=-2)
+
+
+@dispatch
+def cholesky_remove(a: Numeric, indices: Union[tuple, list]):
+    """Given the Cholesky factorisation `a` of a matrix `k`, compute the Cholesky
+    factorisation of `k` with some rows and columns removed in `O(n^2 m)` rather than
+    `O(n^3)` time, where `m` is the number of removed rows and columns.
+
+    Args:
+        a (tensor): Cholesky factorisation of `k`.
+        indices (int or tuple[int] or list[int]): Indices of the rows and columns to
+            remove.
+
+    Returns:
+        tensor: Cholesky factorisation of `k` with the rows and columns removed.
+    """
+    n = int(B.shape(a, -1))
+    # Remove the rows and columns from last to first, so the remaining indices stay
+    # valid.
+    for i in sorted({i % n for i in indices}, reverse=True):
+        if i == int(B.shape(a, -1)) - 1:
+            a = a[..., :i, :i]
+            continue
+        l31 = a[..., i + 1 :, :i]
+        # Removing row and column `i` leaves the block below and to the right of `i`
+        # needing a rank-one update.
+        l33 = cholesky_update(a[..., i + 1 :, i + 1 :], a[..., i + 1 :, i])
+        top = B.concat(a[..., :i, :i], B.transpose(B.zeros(l31)), axis=-1)
+        bottom = B.concat(l31, l33, axis=-1)
+        a = B.concat(top, bottom, axis=-2)
+    return a
+
+
+@dispatch
+def cholesky_remove(a: Numeric, indices: Int):
+    return cholesky_remove(a, (indices,))
+
+
+def _take_batched(a, indices):
+    """For every batch element, take a row of a batch of matrices.
+
+    Args:
+        a (tensor): Batch of matrices.
+        indices (tensor): Index of the row for every batch element.
+
+    Returns:
+        tensor: Rows.
+    """
+    batch_shape, (rows, cols) = B.shape(a)[:-2], B.shape(a)[-2:]
+    # Flatten the batch and index the rows of the flattened matrix.
+    indices = B.flatten(indices)
+    offsets = B.range(B.dtype(indices), 0, B.shape(indices, 0) * rows, rows)
+    res = B.take(B.reshape(a, -1, cols), indices + offsets, axis=0)
+    return B.reshape(res, *batch_shape, cols)
+
+
+@dispatch
+def pivoted_cholesky(a: Numeric, rank: Int, tol=None):
+    """Compute a low-rank approximation `l l^T` of a positive-definite matrix with the
+    pivoted Cholesky decomposition. Only the diagonal and `rank` columns of the matrix
+    are accessed.
+
+    Args:
+        a (tensor or tuple): Matrix or batch of matrices, or a tuple containing the
+            diagonal and a function which takes in, for every batch element, the index
+            of a column and returns those columns.
+        rank (int): Maximum rank of the approximation.
+        tol (float, optional): Stop once the trace of the error of the approximation
+            is below `tol`. Under JIT compilation, the number of columns cannot depend
+            on the data, so the factor then always has `rank` columns and the columns
+            after reaching `tol` are zero. Defaults to using the full rank.
+
+    Returns:
+        tensor: Factor `l` with at most `rank` columns.
+    """
+    return pivoted_cholesky(
+        (B.diag_extract(a), lambda i: _take_batched(a, i)), rank, tol
+    )
+
+
+@dispatch
+def pivoted_cholesky(a: Union[tuple, list], rank: Int, tol=None):
+    d, column = a
+    # Stopping early changes the shape of the result, so do not stop early when the
+    # computation is compiled.
+    stop_early = tol is not None and not (
+        B.control_flow.caching or B.control_flow.use_cache
+    )
+    cols = []
+    for _ in range(min(rank, int(B.shape(d, -1)))):
+        err = B.sum(d, axis=-1)
+        if stop_early and not B.isabstract(err) and B.to_numpy(B.all(err <= tol)):
+            break
+        i = B.argmax(d, axis=-1)
+        d_i = _take_batched(B.expand_dims(d, axis=-1), i)
+        col = column(i)
+        if cols:
+            l = B.stack(*cols, axis=-1)
+            col = col - B.sum(l * B.expand_dims(_take_batched(l, i), axis=-2), axis=-1)
+        # Produce zero columns if the matrix is exhausted or, for this batch element,
+        # the approximation is accurate enough.
+        active = d_i > 0
+        if tol is not None:
+            active = active & (B.expand_dims(err, axis=-1) > tol)
+        col = B.where(active, col / B.sqrt(B.where(active, d_i, B.one(d_i))), 0 * col)
+        d = B.maximum(d - col**2, B.zero(d))
+        cols.append(col)
+    if not cols:
+        return B.zeros(B.dtype(d), *B.shape(d), 0)
+    return B.stack(*cols, axis=-1)
+
+
+@dispatch
+def nystrom(a, indices):
+    """Compute the Nyström approximation `l l^T` of a positive-definite matrix,
+    which only requires the columns of the matrix at a subset of indices.
+
+    Args:
+        a (tensor or function): Matrix or batch of matrices, or function which takes in
+            indices and returns the columns of the matrix at those indices.
+        indices (list or tensor): Indices of the inducing columns.
+
+    Returns:
+        tensor: Factor `l` with `len(indices)` columns.
+    """
+    if callable(a):
+        k_nm = a(indices)
+    else:
+        k_nm = B.take(a, indices, axis=-1)
+    k_mm = B.take(k_nm, indices, axis=-2)
+    # `l = k_nm chol(k_mm)^{-T}`.
+    return B.transpose(triangular_solve(cholesky(k_mm), B.transpose(k_nm)))
+
+
+def _lowrank_capacitance(d, u, s):
+    """For a matrix `diag(d) + u s u^T`, let `v = u chol(s)` and compute `v`,
+    `diag(d)^{-1} v`, and the Cholesky factorisation of the capacitance matrix
+    `I + v^T diag(d)^{-1} v`.
+    """
+    v = matmul(u, cholesky(s))
+    iD_v = v / B.expand_dims(d, axis=-1)
+    c = matmul(v, iD_v, tr_a=True)
+    return iD_v, cholesky(c + B.eye(c))
+
+
+@dispatch
+def lowrank_solve(d: Numeric, u: Numeric, s: Numeric, b: Numeric):
+    """Solve the linear system `(diag(d) + u s u^T) x = b` with the Woodbury
+    identity in `O(n r^2)` rather than `O(n^3)` time, where `r` is the rank of the
+    low-rank part.
+
+    Args:
+        d (tensor): Diagonal `d`. Must be positive.
+        u (tensor): Factor `u` of the low-rank part. Must be of shape `(n, r)`.
+        s (tensor): Middle `s` of the low-rank part. Must be positive definite and of
+            shape `(r, r)`.
+        b (tensor): RHS `b`. This is a vector if it has the same rank as `d` and
+            otherwise a matrix whose columns are right-hand sides.
+
+    Returns:
+        tensor: Solution `x`.
+    """
+    vector = B.rank(b) == B.rank(d)
+    if vector:
+        b = B.expand_dims(b, axis=-1)
+    iD_v, chol_c = _lowrank_capacitance(d, u, s)
+    iD_b = b / B.expand_dims(d, axis=-1)
+    x = iD_b - matmul(iD_v, cholesky_solve(chol_c, matmul(iD_v, b, tr_a=True)))
+    return x[..., 0] if vector else x
+
+
+@dispatch
+def lowrank_logdet(d: Numeric, u: Numeric, s: Numeric):
+    """Compute the log-determinant of `diag(d) + u s u^T` with the matrix
+    determinant lemma in `O(n r^2)` rather than `O(n^3)` time, where `r` is the rank
+    of the low-rank part.
+
+    Args:
+        d (tensor): Diagonal `d`. Must be positive.
+        u (tensor): Factor `u` of the low-rank part. Must be of shape `(n, r)`.
+        s (tensor): Middle `s` of the low-rank part. Must be positive definite and of
+            shape `(r, r)`.
+
+    Returns:
+        tensor: Log-determinant.
+    """
+    _, chol_c = _lowrank_capacitance(d, u, s)
+    logdet_c = 2 * B.sum(B.log(B.diag_extract(chol_c)), axis=-1)
+    return B.sum(B.log(d), axis=-1) + logdet_c
+
+
+@dispatch
+@abstract(promote=3)
+def toeplitz_solve(a, b, c):  # pragma: no cover
+    """Solve the linear system `toep(a, b) x = c` where `toep(a, b)` is a
+    Toeplitz matrix.
+
+    Leading dimensions of `a`, `b`, and `c` are batch dimensions, which are
+    broadcasted.
+
+    Args:
+        a (tensor): First column of the Toeplitz matrix.
+        b (tensor, optional): *Except for the first element*, first row of the
+            Toeplitz matrix. Defaults to `a[1:]`.
+        c (tensor): RHS `c`. This is a vector if it has the same rank as `a` and
+            otherwise a matrix whose columns are right-hand sides.
+
+    Returns:
+        tensor: Solution `x`.
+    """
+
+
+@dispatch
+def toeplitz_solve(a, c):
+    return toeplitz_solve(a, a[..., 1:], c)
+
+
+toepsolve = toeplitz_solve  #: Shorthand for `toeplitz_solve`.
+
+
+def _fori_loop(lower, upper, body, state):
+    for i in range(lower, upper):
+        state = body(i, state)
+    return state
+
+
+def _levinson_recursion(a, b, c, fori_loop=_fori_loop):
+    """Solve Toeplitz systems with the Levinson recursion implemented with tensor
+    operations, so that the solve runs and can be differentiated natively on every
+    backend.
+
+    All vectors in the recursion are kept at their final length and are zero beyond
+    the current step, so every iteration has the same shapes. The loop can then be
+    compiled once rather than unrolled.
+
+    See :func:`.linear_algebra.toeplitz_solve` for a description of the arguments.
+
+    Args:
+        fori_loop (function, optional): Function with the signature of
+            `jax.lax.fori_loop` which runs the loop. Defaults to a Python loop.
+
+    Returns:
+        tensor: Solution `x`.
+        tensor: Whether a leading principal minor is singular.
+    """
+    n = int(B.shape(a, -1))
+    vector = B.rank(c) == B.rank(a)
+    if vector:
+        c = B.expand_dims(c, axis=-1)
+    # Broadcast the batch dimensions, so the state has the same shape throughout.
+    batch = np.broadcast_shapes(
+        tuple(int(d) for d in B.shape(a)[:-1]),
+        tuple(int(d) for d in B.shape(b)[:-1]),
+        tuple(int(d) for d in B.shape(c)[:-2]),
+    )
+    a = B.broadcast_to(a, *batch, n)
+    b = B.broadcast_to(b, *batch, n - 1)
+    c = B.broadcast_to(c, *batch, n, int(B.shape(c, -1)))
+    # Form the Toeplitz matrix by gathering from the concatenation of `a` and `b`.
+    i, j = np.arange(n)[:, None], np.arange(n)[None, :]
+    inds = np.where(i >= j, i - j, n + j - i - 1).reshape(-1)
+    t = B.reshape(B.take(B.concat(a, b, axis=-1), inds, axis=-1), *batch, n, n)
+    b = B.concat(b, 0 * a[..., :1], axis=-1)
+
+    # Initialise the forward vector `f`, the backward vector `g`, and the solution `x`
+    # for the upper-left element of the Toeplitz matrix.
+    # Construct the zeros from slices, because shapes can be tensors when tracing.
+    f = B.concat(1 / a[..., :1], 0 * a[..., 1:], axis=-1)
+    x = B.expand_dims(f, axis=-1) * c[..., :1, :]
+    singular = B.any(a[..., :1] == 0)
+
+    def body(m, state):
+        f, g, x, singular = state
+        # Beyond step `m`, `f`, `g`, and `x` are zero, so the full rows can be used.
+        row = t[..., m, :]
+        e_f = B.sum(row * f, axis=-1, squeeze=False)
+        e_b = B.sum(b * g, axis=-1, squeeze=False)
+        e_x = B.sum(B.expand_dims(row, axis=-1) * x, axis=-2, squeeze=False)
+        g_shifted = B.concat(0 * g[..., :1], g[..., :-1], axis=-1)
+        denom = 1 - e_f * e_b
+        singular = singular | B.any(denom == 0)
+        f, g = (f - e_f * g_shifted) / denom, (g_shifted - e_b * f) / denom
+        c_m = B.expand_dims(c[..., m, :], axis=-2)
+        x = x + (c_m - e_x) * B.expand_dims(g, axis=-1)
+        return f, g, x, singular
+
+    _, _, x, singular = fori_loop(1, n, body, (f, f, x, singular))
+    return (x[..., 0] if vector else x), singular
+
+
+def _levinson_check(x, singular):
+    """Raise an error if :func:`.linear_algebra._levinson_recursion` found a singular
+    principal minor. This can only be detected if the values are concrete.
+    """
+    if not B.isabstract(singular) and B.to_numpy(singular):
+        raise np.linalg.LinAlgError("Singular principal minor.")
+    return x
+
+
+@dispatch
+def toeplitz_matmul(a: Numeric, b: Numeric, x: Numeric):
+    """Multiply a Toeplitz matrix `toep(a, b)` by `x` in `O(n log n)` rather than
+    `O(n^2)` time, by embedding `toep(a, b)` in a circulant matrix.
+
+    Args:
+        a (tensor): First column of the Toeplitz matrix.
+        b (tensor, optional): *Except for the first element*, first row of the
+            Toeplitz matrix. Defaults to `a[1:]`.
+        x (tensor): Vector or matrix to multiply.
+
+    Returns:
+        tensor: Product `toep(a, b) x`.
+    """
+    n = int(B.shape(a, -1))
+    vector = B.rank(x) == B.rank(a)
+    if vector:
+        x = B.expand_dims(x, axis=-1)
+    if n > 1:
+        # The circulant matrix of size `2n - 1` with first column `[a, reverse(b)]`
+        # contains `toep(a, b)` in its upper-left corner.
+        a = B.concat(a, B.take(b, list(range(n - 2, -1, -1)), axis=-1), axis=-1)
+        x = B.concat(x, B.zeros(x[..., : n - 1, :]), axis=-2)
+    spectrum = B.multiply(
+        B.expand_dims(B.rfft(a, axis=-1), axis=-1), B.rfft(x, axis=-2)
+    )
+    res = B.irfft(spectrum, n=2 * n - 1, axis=-2)[..., :n, :]
+    return res[..., 0] if vector else res
+
+
+@dispatch
+def toeplitz_matmul(a: Numeric, x: Numeric):
+    return toeplitz_matmul(a, a[..., 1:], x)
+
+
+def _as_matvec(a):
+    # Turn a matrix into a function which multiplies with it.
+    if callable(a):
+        return a
+    else:
+        return lambda x: B.matmul(a, x)
+
+
+def cg_solve(a, b, precond=None, tol=1e-6, maxiter=None):
+    """Solve `a x = b` for a symmetric positive-definite matrix `a` with the
+    conjugate gradient method. Only products with `a` are required, so `a` can be given
+    as a function.
+
+    Every column of `b` is solved separately, and a column stops being updated once it
+    has converged. The loop is a :func:`.generic.while_loop`, so this function can be
+    compiled with :func:`.generic.jit`.
+
+    If `a` is a matrix, then gradients with respect to `a` and `b` are computed by
+    implicit differentiation, which requires one more solve rather than
+    differentiating through the iterations. If `a` is a function, then gradients are
+    computed by differentiating through the iterations.
+
+    Args:
+        a (matrix or function): Matrix, or function which multiplies a matrix of column
+            vectors by the matrix.
+        b (tensor): Right-hand side. Can be a vector or a batch of matrices of column
+            vectors.
+        precond (matrix or function, optional): Preconditioner, which should
+            approximate the *inverse* of `a`, or a function which multiplies by it.
+            Defaults to no preconditioner.
+        tol (float, optional): Tolerance for the norm of the residual relative to the
+            norm of the right-hand side. Defaults to `1e-6`.
+        maxiter (int, optional): Maximum number of iterations. Defaults to ten times
+            the size of `a`.
+
+    Returns:
+        tensor: Solution `x`.
+    """
+    precond = (lambda r: r) if precond is None else _as_matvec(precond)
+    vector = B.rank(b) == 1
+    if vector:
+        b = B.expand_dims(b, axis=-1)
+    if maxiter is None:
+        # In floating point, ill-conditioned systems can need more iterations than the
+        # size of the system.
+        maxiter = 10 * int(B.shape(b, -2))
+
+    def solve(a, b):
+        return _cg_iterate(_as_matvec(a), precond, b, tol, maxiter)
+
+    if callable(a):
+        x = solve(a, b)
+    else:
+        x = _cg_solve_implicit(a, b, solve)
+    return x[..., 0] if vector else x
+
+
+def _cg_iterate(matvec, precond, b, tol, maxiter):
+    def norm(r):
+        return B.sqrt(B.sum(r * r, axis=-2, squeeze=False))
+
+    def inner(x, y):
+        return B.sum(B.multiply(x, y), axis=-2, squeeze=False)
+
+    threshold = tol * norm(b)
+
+    def f_cond(i, x, r, p, rz):
+        return B.any(B.gt(norm(r), threshold)) & (i < maxiter)
+
+    def f_body(i, x, r, p, rz):
+        active = B.gt(norm(r), threshold)
+        ap = matvec(p)
+        # Do not divide by zero for columns which have converged.
+        p_ap = B.where(active, inner(p, ap), B.one(rz))
+        alpha = B.where(active, rz / p_ap, B.zero(rz))
+        x = B.add(x, B.multiply(alpha, p))
+        r = B.subtract(r, B.multiply(alpha, ap))
+        z = precond(r)
+        rz_new = inner(r, z)
+        beta = B.where(active, rz_new / B.where(active, rz, B.one(rz)), B.zero(rz))
+        p = B.add(z, B.multiply(beta, p))
+        return i + 1, x, r, p, B.where(active, rz_new, rz)
+
+    z = precond(b)
+    _, x, _, _, _ = B.while_loop(
+        f_cond,
+        f_body,
+        B.zeros(B.dtype_int(b)),
+        0 * b,
+        b,
+        z,
+        inner(b, z),
+    )
+    return x
+
+
+def _sum_to_shape(x, shape):
+    """Sum a tensor which was broadcasted from a shape back to that shape.
+
+    Args:
+        x (tensor): Tensor.
+        shape (tuple[int]): Shape before broadcasting.
+
+    Returns:
+        tensor: `x` summed to `shape`.
+    """
+    for _ in range(B.rank(x) - len(shape)):
+        x = B.sum(x, axis=0)
+    for i, d in enumerate(shape):
+        if d == 1 and B.shape(x, i) != 1:
+            x = B.sum(x, axis=i, squeeze=False)
+    return x
+
+
+def _s_cg_solve(solve, s_x, x, a, b):
+    """Compute the sensitivities of `x = a^{-1} b` for a symmetric matrix `a` by
+    implicit differentiation.
+
+    Args:
+        solve (function): Function which takes in `a` and `b` and solves `a x = b`.
+        s_x (tensor): Sensitivity of `x`.
+        x (tensor): Solution `x`.
+        a (tensor): Matrix `a`.
+        b (tensor): Right-hand side `b`.
+
+    Returns:
+        tuple[tensor]: Sensitivities of `a` and `b`.
+    """
+    s_b = solve(a, s_x)
+    s_a = -B.matmul(s_b, x, tr_b=True)
+    return _sum_to_shape(s_a, B.shape(a)), _sum_to_shape(s_b, B.shape(b))
+
+
+@dispatch
+def _cg_solve_implicit(a: Numeric, b: Numeric, solve: FunctionType):
+    """Solve `a x = b` with a gradient computed by implicit differentiation.
+
+    Args:
+        a (tensor): Symmetric matrix `a`.
+        b (tensor): Right-hand side `b`.
+        solve (function): Function which takes in `a` and `b` and solves `a x = b`.
+
+    Returns:
+        tensor: Solution `x`.
+    """
+    return solve(a, b)
+
+
+def _rademacher(state, dtype, *shape):
+    # Sample from the global random state if `state` is `None`.
+    if state is None:
+        return None, B.sign(B.randn(dtype, *shape))
+    else:
+        state, z = B.randn(state, dtype, *shape)
+        return state, B.sign(z)
+
+
+def _estimate_dtype(a, dtype):
+    if dtype is not None:
+        return dtype
+    elif callable(a):
+        return B.default_dtype
+    else:
+        return B.dtype(a)
+
+
+def _trace_estimate(state, a, n, num_probes, dtype, method):
+    matvec = _as_matvec(a)
+    dtype = _estimate_dtype(a, dtype)
+
+    def inner(x, y):
+        return B.sum(B.multiply(x, y), axis=-2)
+
+    if method == "hutch++":
+        # Use a third of the products to find the dominant subspace, a third to
+        # compute the trace in that subspace, and a third to estimate the trace of the
+        # remainder.
+        num_sketch = num_probes // 3
+    elif method == "hutchinson":
+        num_sketch = 0
+    else:
+        raise ValueError(f'Unknown method "{method}".')
+
+    if num_sketch == 0:
+        state, z = _rademacher(state, dtype, n, num_probes)
+        return state, B.mean(inner(z, matvec(z)), axis=-1)
+
+    state, s = _rademacher(state, dtype, n, num_sketch)
+    q, _, _ = B.svd(matvec(s))
+    state, z = _rademacher(state, dtype, n, num_probes - 2 * num_sketch)
+    # Project the probes onto the orthogonal complement of the dominant subspace.
+    z_perp = B.subtract(z, B.matmul(q, B.matmul(q, z, tr_a=True)))
+    a_q_z = matvec(B.concat(q, z_perp, axis=-1))
+    # The basis `q` has fewer columns than the sketch if the sketch is wider than `a`.
+    rank = int(B.shape(q, -1))
+    a_q, a_z_perp = a_q_z[..., :rank], a_q_z[..., rank:]
+    # `tr(a) = tr(q^T a q) + tr((I - q q^T) a (I - q q^T))`. Estimate the second term
+    # with the projected probes.
+    est = B.sum(inner(q, a_q), axis=-1) + B.mean(inner(z_perp, a_z_perp), axis=-1)
+    return state, est
+
+
+@dispatch
+def trace_estimate(
+    state: RandomState,
+    a,
+    n: Int,
+    num_probes: Int = 30,
+    *,
+    dtype=None,
+    method: str = "hutch++",
+):
+    """Estimate the trace of a matrix without forming the matrix. The estimate is
+    unbiased.
+
+    Args:
+        state (random state, optional): Random state.
+        a (matrix or function): Matrix or batch of matrices, or function which
+            multiplies a matrix of column vectors by the matrix.
+        n (int): Size of the matrix.
+        num_probes (int, optional): Number of products with the matrix. Defaults to
+            `30`.
+        dtype (dtype, optional): Data type of the probes. Defaults to the data type
+            of `a` or, if `a` is a function, the default data type.
+        method (str, optional): Estimator. Must be `"hutchinson"` or `"hutch++"`.
+            Hutch++ first finds the dominant subspace of the matrix, which strongly
+            reduces the variance for matrices with decaying spectra. Defaults to
+            `"hutch++"`.
+
+    Returns:
+        state (random state, optional): Random state.
+        scalar: Estimate of the trace.
+    """
+    return _trace_estimate(state, a, n, num_probes, dtype, method)
+
+
+# A NumPy array can be a random state, so `trace_estimate(a, n, num_probes)` is ambiguous
+# with `trace_estimate(state, a, n)`. If `a` is a random state, `n` cannot be an integer.
+@dispatch(precedence=1)
+def trace_estimate(
+    a,
+    n: Int,
+    num_probes: Int = 30,
+    *,
+    dtype=None,
+    method: str = "hutch++",
+):
+    return _trace_estimate(None, a, n, num_probes, dtype, method)[1]
+
+
+def _logdet_estimate(state, a, n, num_probes, num_steps, dtype):
+    matvec = _as_matvec(a)
+    dtype = _estimate_dtype(a, dtype)
+    num_steps = min(num_steps, n)
+
+    def inner(x, y):
+        return B.sum(B.multiply(x, y), axis=-2, squeeze=False)
+
+    # Run the Lanczos algorithm for all probes at once. Rademacher probes have norm
+    # `sqrt(n)`.
+    state, z = _rademacher(state, dtype, n, num_probes)
+    q, q_prev = z / np.sqrt(n), 0
+    alphas, betas = [], []
+    for j in range(num_steps):
+        w = matvec(q)
+        alpha = inner(q, w)
+        alphas.append(alpha)
+        if j == num_steps - 1:
+            break
+        w = B.subtract(w, B.multiply(alpha, q))
+        if j > 0:
+            w = B.subtract(w, B.multiply(betas[-1], q_prev))
+        beta = B.sqrt(inner(w, w))
+        betas.append(beta)
+        # On breakdown, the Krylov subspace is exhausted, and the remaining vectors
+        # should be zero.
+        q_prev, q = q, w / B.where(beta > 0, beta, B.one(beta))
+
+    # Construct the tridiagonal matrices. Put the probes in the batch dimension.
+    betas = B.transpose(B.concat(*betas, 0 * alphas[0], axis=-2))
+    alphas = B.transpose(B.concat(*alphas, axis=-2))
+    eye = B.eye(B.dtype(alphas), num_steps + 1, num_steps)
+    upper = B.expand_dims(betas, axis=-1) * eye[1:]
+    t = B.expand_dims(alphas, axis=-2) * eye[:-1] + upper + B.transpose(upper)
+
+    # Use Gauss quadrature to approximate `z^T log(a) z`. Eigenvalues which are zero
+    # due to breakdown have zero weight.
+    vals, vecs = B.eigh(t)
+    log_vals = B.log(B.where(vals > 0, vals, B.one(vals)))
+    quads = n * B.sum(vecs[..., 0, :] ** 2 * log_vals, axis=-1)
+    return state, B.mean(quads, axis=-1)
+
+
+@dispatch
+def logdet_estimate(
+    state: RandomState,
+    a,
+    n: Int,
+    num_probes: Int = 30,
+    *,
+    num_steps: Int = 20,
+    dtype=None,
+):
+    """Estimate the log-determinant of a positive-definite matrix without forming the
+    matrix with stochastic Lanczos quadrature.
+
+    Args:
+        state (random state, optional): Random state.
+        a (matrix or function): Matrix or batch of matrices, or function which
+            multiplies a matrix of column vectors by the matrix.
+        n (int): Size of the matrix.
+        num_probes (int, optional): Number of probes. Defaults to `30`.
+        num_steps (int, optional): Number of Lanczos iterations per probe. Defaults to
+            `20`.
+        dtype (dtype, optional): Data type of the probes. Defaults to the data type
+            of `a` or, if `a` is a function, the default data type.
+
+    Returns:
+        state (random state, optional): Random state.
+        scalar: Estimate of the log-determinant.
+    """
+    return _logdet_estimate(state, a, n, num_probes, num_steps, dtype)
+
+
+# A NumPy array can be a random state, so `logdet_estimate(a, n, num_probes)` is ambiguous
+# with `logdet_estimate(state, a, n)`. If `a` is a random state, `n` cannot be an integer.
+@dispatch(precedence=1)
+def logdet_estimate(
+    a,
+    n: Int,
+    num_probes: Int = 30,
+    *,
+    num_steps: Int = 20,
+    dtype=None,
+):
+    return _logdet_estimate(None, a, n, num_probes, num_steps, dtype)[1]
+
+
+def _orth(a):
+    # LAB has no QR decomposition, so find an orthonormal basis with the SVD.
+    return B.svd(a)[0]
+
+
+def _randomized_range(state, a, rank, oversample, power_iters, n, dtype):
+    """Find an orthonormal basis which approximately contains the range of a matrix.
+    See Halko, Martinsson, and Tropp (2011), "Finding Structure with Randomness:
+    Probabilistic Algorithms for Constructing Approximate Matrix Decompositions".
+
+    Returns:
+        random state or `None`: Random state.
+        tensor: Basis.
+        function: Function which multiplies by the matrix.
+        function: Function which multiplies by the transpose of the matrix.
+    """
+    if callable(a):
+        if n is None:
+            raise ValueError("The size `n` must be given if `a` is a function.")
+        # The function multiplies by a symmetric matrix.
+        matvec, rmatvec = a, a
+        n_rows, n_cols = n, n
+    else:
+        matvec = _as_matvec(a)
+
+        def rmatvec(x):
+            return B.matmul(a, x, tr_a=True)
+
+        n_rows, n_cols = int(B.shape(a, -2)), int(B.shape(a, -1))
+    dtype = _estimate_dtype(a, dtype)
+    width = min(rank + oversample, n_rows, n_cols)
+
+    if state is None:
+        sketch = B.randn(dtype, n_cols, width)
+    else:
+        state, sketch = B.randn(state, dtype, n_cols, width)
+    y = matvec(sketch)
+    # Orthonormalise in between power iterations to not lose the smaller components
+    # due to round-off errors.
+    for _ in range(power_iters):
+        y = matvec(_orth(rmatvec(_orth(y))))
+    return state, _orth(y), matvec, rmatvec
+
+
+def _randomized_svd(state, a, rank, oversample, power_iters, n, dtype):
+    state, q, _, rmatvec = _randomized_range(
+        state, a, rank, oversample, power_iters, n, dtype
+    )
+    # Decompose `a^T q`, which is small.
+    v, s, u_small = B.svd(rmatvec(q))
+    u = B.matmul(q, u_small)
+    return state, (u[..., :rank], s[..., :rank], v[..., :rank])
+
+
+@dispatch
+def randomized_svd(
+    state: RandomState,
+    a,
+    rank: Int,
+    *,
+    oversample: Int = 10,
+    power_iters: Int = 2,
+    n: Optional[Int] = None,
+    dtype=None,
+):
+    """Compute a truncated singular value decomposition with a randomised algorithm in
+    `O(n^2 r)` rather than `O(n^3)` time.
+
+    Args:
+        state (random state, optional): Random state.
+        a (matrix or function): Matrix or batch of matrices, or function which
+            multiplies a matrix of column vectors by a *symmetric* matrix.
+        rank (int): Number of singular values and vectors to compute.
+        oversample (int, optional): Number of additional random directions to sketch
+            with. Defaults to `10`.
+        power_iters (int, optional): Number of power iterations, which improve the
+            accuracy for slowly decaying spectra. Defaults to `2`.
+        n (int, optional): Size of the matrix. Must be given if `a` is a function.
+        dtype (dtype, optional): Data type of the sketch. Defaults to the data type
+            of `a` or, if `a` is a function, the default data type.
+
+    Returns:
+        state (random state, optional): Random state.
+        tuple[tensor]: Tuple containing `U`, `S`, and `V` such that `a` is
+            approximately `U diag(S) V^T`.
+    """
+    return _randomized_svd(state, a, rank, oversample, power_iters, n, dtype)
+
+
+@dispatch
+def randomized_svd(
+    a,
+    rank: Int,
+    *,
+    oversample: Int = 10,
+    power_iters: Int = 2,
+    n: Optional[Int] = None,
+    dtype=None,
+):
+    return _randomized_svd(None, a, rank, oversample, power_iters, n, dtype)[1]
+
+
+def _eigh_topk(state, a, k, oversample, power_iters, n, dtype):
+    state, q, matvec, _ = _randomized_range(
+        state, a, k, oversample, power_iters, n, dtype
+    )
+    # Rayleigh-Ritz: decompose `q^T a q`, which is small. Symmetrise it to remove
+    # round-off errors.
+    t = B.matmul(q, matvec(q), tr_a=True)
+    vals, vecs = B.eigh(0.5 * (t + B.transpose(t)))
+    # Select the eigenvalues of largest magnitude.
+    inds = _smallest_k(-B.abs(vals), k)
+    vals = _take_along_last(vals, inds)
+    inds = B.broadcast_to(B.expand_dims(inds, axis=-2), *B.shape(vecs)[:-1], k)
+    vecs = B.matmul(q, _take_along_last(vecs, inds))
+    return state, (vals, vecs)
+
+
+@dispatch
+def eigh_topk(
+    state: RandomState,
+    a,
+    k: Int,
+    *,
+    oversample: Int = 10,
+    power_iters: Int = 2,
+    n: Optional[Int] = None,
+    dtype=None,
+):
+    """Compute the eigenvalues of largest magnitude and corresponding eigenvectors of a
+    symmetric matrix with a randomised algorithm in `O(n^2 k)` rather than `O(n^3)`
+    time.
+
+    Args:
+        state (random state, optional): Random state.
+        a (matrix or function): Symmetric matrix or batch of symmetric matrices, or
+            function which multiplies a matrix of column vectors by the matrix.
+        k (int): Number of eigenvalues and eigenvectors to compute.
+        oversample (int, optional): Number of additional random directions to sketch
+            with. Defaults to `10`.
+        power_iters (int, optional): Number of power iterations, which improve the
+            accuracy for slowly decaying spectra. Defaults to `2`.
+        n (int, optional): Size of the matrix. Must be given if `a` is a function.
+        dtype (dtype, optional): Data type of the sketch. Defaults to the data type
+            of `a` or, if `a` is a function, the default data type.
+
+    Returns:
+        state (random state, optional): Random state.
+        tuple[tensor]: Tuple containing the eigenvalues in order of decreasing
+            magnitude and the eigenvectors as columns.
+    """
+    return _eigh_topk(state, a, k, oversample, power_iters, n, dtype)
+
+
+@dispatch
+def eigh_topk(
+    a,
+    k: Int,
+    *,
+    oversample: Int = 10,
+    power_iters: Int = 2,
+    n: Optional[Int] = None,
+    dtype=None,
+):
+    return _eigh_topk(None, a, k, oversample, power_iters, n, dtype)[1]
+
+
+def _a_b_uprank(a, b):
+    a = B.uprank(a)
+    b = B.uprank(b)
+    return a, b
+
+
+@dispatch
+def outer(a, b):
+    """Compute the outer product between two vectors or matrices.
+
+    Args:
+        a (tensor): First tensor.
+        b (tensor): Second tensor.
+
+    Returns:
+        tensor: Outer product of `a` and `b`.
+    """
+    a, b = _a_b_uprank(a, b)
+
+    # Optimise the case that both are column vectors.
+    if B.shape(a, -1) == 1 and B.shape(b, -1) == 1:
+        return a * B.transpose(b)
+
+    return B.matmul(a, b, tr_b=True)
+
+
+@dispatch
+def outer(a):
+    return outer(a, a)
+
+
+@dispatch
+def reg(a, diag=None, clip: bool = True):
+    """Add a diagonal to a matrix.
+
+    Args:
+        a (matrix): Matrix to add a diagonal to.
+        diag (float, optional): Magnitude of the diagonal to add. Defaults to
+            `.linear_algebra.epsilon`.
+        clip (bool, optional): Let `diag` be at least `.linear_algebra.epsilon`.
+            Defaults to `True`.
+
+    Returns:
+        matrix: Regularised version of `a`.
+    """
+    # Careful to use `B.epsilon` here and not `epsilon`! Otherwise, changes
+    # will not be tracked.
+    if diag is None:
+        diag = B.epsilon
+    if clip and diag is not B.epsilon:
+        diag = B.maximum(diag, B.epsilon)
+    return a + diag * B.eye(a)
+
+
+def _block_shape(a, b, block_size, memory_budget, square):
+    n = int(B.shape(a, -2))
+    m = int(B.shape(b, -2))
+    if block_size is not None:
+        if isinstance(block_size, (tuple, list)):
+            rows, cols = block_size
+        else:
+            rows, cols = block_size, block_size
+    else:
+        dtype = convert(B.dtype(a, b), NPDType)
+        batch_shape = np.broadcast_shapes(
+            tuple(int(d) for d in B.shape(a)[:-2]),
+            tuple(int(d) for d in B.shape(b)[:-2]),
+        )
+        size = memory_budget // (np.dtype(dtype).itemsize * int(np.prod(batch_shape)))
+        if size >= m and not square:
+            # Prefer tiles which span all columns.
+            rows, cols = size // m, m
+        else:
+            rows = cols = int(np.sqrt(size))
+    return max(min(int(rows), n), 1), max(min(int(cols), m), 1)
+
+
+def _pw_blocks(f, a, b, block_size, memory_budget, upper=False):
+    """Compute a pairwise quantity in tiles.
+
+    Args:
+        f (function): Function which computes the pairwise quantity between two
+            matrices. If `b` is `None`, then `f` must also accept one matrix and must
+            be symmetric.
+        a (matrix): First matrix.
+        b (matrix or None): Second matrix. If `b` is `None`, then the quantity is
+            computed between `a` and itself, and a memory budget gives square tiles.
+        block_size (int or tuple[int, int] or None): Number of rows and columns of a
+            tile. An integer gives square tiles.
+        memory_budget (int or None): Maximum size of a tile in bytes. Only used if
+            `block_size` is `None`.
+        upper (bool, optional): If `b` is `None` and the tiles are square, only
+            compute the tiles on and above the diagonal. Defaults to `False`.
+
+    Returns:
+        generator: Generator which yields the rows and columns as slices and the tile.
+    """
+    symmetric = b is None
+    a = B.uprank(a)
+    b = a if symmetric else B.uprank(b)
+    rows, cols = _block_shape(a, b, block_size, memory_budget, symmetric)
+    # Tiles on the diagonal can use the symmetric computation only if they are
+    # square.
+    symmetric = symmetric and rows == cols
+    n = int(B.shape(a, -2))
+    m = int(B.shape(b, -2))
+    for i in range(0, n, rows):
+        a_block = a[..., i : i + rows, :]
+        for j in range(0, m, cols):
+            if symmetric and i == j:
+                tile = f(a_block)
+            elif symmetric and upper and j < i:
+                continue
+            else:
+                tile = f(a_block, b[..., j : j + cols, :])
+            yield slice(i, min(i + rows, n)), slice(j, min(j + cols, m)), tile
+
+
+def _pw_blocked(f, a, b, block_size, memory_budget):
+    """Compute a pairwise quantity tile by tile to limit the size of the temporaries.
+    Takes in the same arguments as :func:`_pw_blocks`. If `b` is `None`, then only
+    the tiles on and above the diagonal are computed and the others are mirrored.
+
+    Returns:
+        matrix: Pairwise quantity.
+    """
+    tiles = {}
+    for rows, cols, tile in _pw_blocks(f, a, b, block_size, memory_budget, True):
+        tiles[rows.start, cols.start] = tile
+    if len(tiles) == 0:
+        # There are no elements. Just do the computation.
+        return f(a) if b is None else f(a, b)
+    elif len(tiles) == 1:
+        return tiles[0, 0]
+
+    def get_tile(i, j):
+        if (i, j) in tiles:
+            return tiles[i, j]
+        else:
+            return B.transpose(tiles[j, i])
+
+    row_starts = sorted({i for i, _ in tiles})
+    col_starts = sorted({j for _, j in tiles})
+    return B.concat(
+        *(B.concat(*(get_tile(i, j) for j in col_starts), axis=-1) for i in row_starts),
+        axis=-2,
+    )
+
+
+@dispatch
+def pw_dists2(a, b, *, block_size=None, memory_budget=None):
+    """Compute the square the Euclidean norm of the pairwise differences between two
+    matrices where rows correspond to elements and columns to features.
+
+    Args:
+        a (matrix): First matrix.
+        b (matrix, optional): Second matrix. Defaults to `a`.
+        block_size (int or tuple[int, int], optional): Compute the result in tiles
+            with this number of rows and columns to limit the size of temporaries. An
+            integer gives square tiles.
+        memory_budget (int, optional): Compute the result in tiles of at most this
+            many bytes. Only used if `block_size` is not given.
+
+    Returns:
+        matrix: Square of the Euclidean norm of the pairwise differences
+            between the elements of `a` and `b`.
+    """
+    if block_size is not None or memory_budget is not None:
+        return _pw_blocked(pw_dists2, a, b, block_size, memory_budget)
+
+    a, b = _a_b_uprank(a, b)
+
+    # Optimise the one-dimensional case.
+    if B.shape(a, -1) == 1 and B.shape(b, -1) == 1:
+        return (a - B.transpose(b)) ** 2
+
+    norms_a = B.sum(a**2, axis=-1)[..., :, None]
+    norms_b = B.sum(b**2, axis=-1)[..., None, :]
+    # Cancellation can make the result slightly negative for nearby points.
+    res = norms_a + norms_b - 2 * B.matmul(a, b, tr_b=True)
+    return B.maximum(res, B.zero(res))
+
+
+@dispatch
+def pw_dists2(a, *, block_size=None, memory_budget=None):
+    if block_size is not None or memory_budget is not None:
+        return _pw_blocked(pw_dists2, a, None, block_size, memory_budget)
+
+    a = B.uprank(a)
+
+    # Optimise the one-dimensional case.
+    if B.shape(a, -1) == 1:
+        return (a - B.transpose(a)) ** 2
+
+    # Compute the norms from the Gram matrix, which makes the diagonal exactly zero.
+    # Multiplying `a` with itself allows NumPy to use a symmetric rank-k update.
+    gram = B.matmul(a, a, tr_b=True)
+    norms = B.diag_extract(gram)
+    # Cancellation can make the result slightly negative for nearby points.
+    res = norms[..., :, None] + norms[..., None, :] - 2 * gram
+    return B.maximum(res, B.zero(res))
+
+
+def pw_dists2_blocks(a, b=None, *, block_size=None, memory_budget=2**27):
+    """Compute :func:`.pw_dists2` in tiles, which allows reductions to consume the
+    pairwise distances without ever holding the whole matrix.
+
+    Args:
+        a (matrix): First matrix.
+        b (matrix, optional): Second matrix. Defaults to `a`.
+        block_size (int or tuple[int, int], optional): Number of rows and columns of
+            a tile. An integer gives square tiles.
+        memory_budget (int, optional): Maximum size of a tile in bytes. Only used if
+            `block_size` is not given. Defaults to 128 MiB.
+
+    Returns:
+        generator: Generator which yields tuples containing the rows of `a` and the
+            rows of `b` of the tile as slices and the tile.
+    """
+    return _pw_blocks(pw_dists2, a, b, block_size, memory_budget)
+
+
+@dispatch
+@abstract()
+def _smallest_k(a: Numeric, k: Int):  # pragma: no cover
+    """Find the indices of the `k` smallest elements along the last axis.
+
+    Args:
+        a (tensor): Tensor to search.
+        k (int): Number of elements.
+
+    Returns:
+        tensor: Indices of the `k` smallest elements in ascending order of the
+            elements.
+    """
+
+
+def _take_along_last(a, indices):
+    """Take elements along the last axis, separately for every other index.
+
+    Args:
+        a (tensor): Tensor to take elements from.
+        indices (tensor): Indices of the elements to take. Must have the same shape as
+            `a` except in the last axis.
+
+    Returns:
+        tensor: Elements.
+    """
+    shape = B.shape(indices)
+    n, k = int(np.prod([int(d) for d in shape[:-1]])), int(shape[-1])
+    cols = int(B.shape(a, -1))
+    # Flatten everything and offset the indices to the right rows.
+    offsets = B.range(B.dtype(indices), 0, n * cols, cols)[:, None]
+    indices = B.flatten(B.reshape(indices, n, k) + offsets)
+    return B.reshape(B.take(B.flatten(a), indices), *shape)
+
+
+def knn(a, b, k, *, block_size=None, memory_budget=2**27):
+    """For every row of `a`, find the `k` nearest rows of `b` in Euclidean distance.
+    The pairwise distances are computed in tiles, and only a running selection of the
+    `k` nearest rows is kept. The full distance matrix is never held.
+
+    Args:
+        a (matrix): Queries.
+        b (matrix): Rows to search.
+        k (int): Number of neighbours.
+        block_size (int or tuple[int, int], optional): Number of rows and columns of
+            a tile. An integer gives square tiles.
+        memory_budget (int, optional): Maximum size of a tile in bytes. Only used if
+            `block_size` is not given. Defaults to 128 MiB.
+
+    Returns:
+        tensor: Indices of the `k` nearest rows of `b`, from nearest to furthest.
+        tensor: Corresponding distances.
+    """
+    a, b = _a_b_uprank(a, b)
+    if k > int(B.shape(b, -2)):
+        raise ValueError(
+            f"Cannot find {k} nearest neighbours among {int(B.shape(b, -2))} rows."
+        )
+
+    results = []
+    for rows, cols, tile in _pw_blocks(pw_dists2, a, b, block_size, memory_budget):
+        tile_indices = B.range(B.dtype_int(tile), cols.start, cols.stop)
+        tile_indices = B.broadcast_to(tile_indices, *B.shape(tile))
+        if cols.start == 0:
+            # A new block of rows starts.
+            results.append(None)
+            dists2, indices = tile, tile_indices
+        else:
+            dists2 = B.concat(results[-1][0], tile, axis=-1)
+            indices = B.concat(results[-1][1], tile_indices, axis=-1)
+        # Only keep the `k` nearest rows seen so far.
+        selection = _smallest_k(dists2, min(k, int(B.shape(dists2, -1))))
+        results[-1] = (
+            _take_along_last(dists2, selection),
+            _take_along_last(indices, selection),
+        )
+
+    dists2 = B.concat(*(r[0] for r in results), axis=-2)
+    indices = B.concat(*(r[1] for r in results), axis=-2)
+    # The squared distances are clamped at zero, so exact matches have distance zero.
+    return indices, B.sqrt(dists2)
+
+
+@dispatch
+def pw_dists(a, b, *, block_size=None, memory_budget=None):
+    """Compute the Euclidean norm of the pairwise differences between two matrices
+    where rows correspond to elements and columns to features.
+
+    Args:
+        a (matrix): First matrix.
+        b (matrix, optional): Second matrix. Defaults to `a`.
+        block_size (int or tuple[int, int], optional): Compute the result in tiles
+            with this number of rows and columns to limit the size of temporaries. An
+            integer gives square tiles.
+        memory_budget (int, optional): Compute the result in tiles of at most this
+            many bytes. Only used if `block_size` is not given.
+
+    Returns:
+        matrix: Euclidean norm of the pairwise differences between the
+            elements of `a` and `b`.
+    """
+    if block_size is not None or memory_budget is not None:
+        return _pw_blocked(pw_dists, a, b, block_size, memory_budget)
+
+    a, b = _a_b_uprank(a, b)
+
+    # Optimise the one-dimensional case.
+    if B.shape(a, -1) == 1 and B.shape(b, -1) == 1:
+        return B.abs(a - B.transpose(b))
+
+    return B.sqrt(B.maximum(B.pw_dists2(a, b), B.cast(B.dtype(a), 1e-30)))
+
+
+@dispatch
+def pw_dists(a, *, block_size=None, memory_budget=None):
+    if block_size is not None or memory_budget is not None:
+        res = _pw_blocked(pw_dists, a, None, block_size, memory_budget)
+    else:
+        a = B.uprank(a)
+
+        # Optimise the one-dimensional case.
+        if B.shape(a, -1) == 1:
+            return B.abs(a - B.transpose(a))
+
+        res = B.sqrt(B.maximum(B.pw_dists2(a), B.cast(B.dtype(a), 1e-30)))
+
+    # Make the diagonal exactly zero rather than the square root of the lower bound.
+    # Selecting with `where` keeps the gradient on the diagonal zero.
+    diagonal = B.eye(B.dtype(res), int(B.shape(res, -1))) == 1
+    return B.where(diagonal, B.zero(res), res)
+
+
+def _pw_inner(a, b=None):
+    # Multiplying `a` with itself allows NumPy to use a symmetric rank-k update.
+    return B.matmul(a, a if b is None else b, tr_b=True)
+
+
+def _pw_manhattan(a, b=None):
+    if b is None:
+        b = a
+    # Accumulate over the features to avoid a temporary with all features.
+    res = None
+    for i in range(int(B.shape(a, -1))):
+        diffs = B.abs(a[..., :, i : i + 1] - B.transpose(b[..., :, i : i + 1]))
+        res = diffs if res is None else res + diffs
+    return res
+
+
+_pw_metrics = {
+    "euclidean": pw_dists,
+    "sqeuclidean": pw_dists2,
+    "cosine": _pw_inner,
+    "manhattan": _pw_manhattan,
+    "mahalanobis": pw_dists,
+}
+
+
+def _normalise_rows(a):
+    norms = B.sqrt(B.sum(a**2, axis=-1))[..., :, None]
+    return a / B.maximum(norms, B.cast(B.dtype(a), 1e-30))
+
+
+def _whiten_rows(chol, a):
+    return B.transpose(triangular_solve(chol, B.transpose(a)))
+
+
+def _pw_metric(a, b, metric, chol, block_size, memory_budget):
+    if metric not in _pw_metrics:
+        raise ValueError(
+            f'Unknown metric "{metric}". '
+            f"Must be one of {', '.join(repr(m) for m in _pw_metrics)}."
+        )
+    a = B.uprank(a)
+    b = None if b is None else B.uprank(b)
+
+    # Transform the inputs such that the metric reduces to a cheaper one.
+    if metric == "cosine":
+        a = _normalise_rows(a)
+        b = None if b is None else _normalise_rows(b)
+    elif metric == "mahalanobis":
+        if chol is None:
+            raise ValueError(
+                "The Mahalanobis distance requires the Cholesky factor `chol`."
+            )
+        a = _whiten_rows(chol, a)
+        b = None if b is None else _whiten_rows(chol, b)
+
+    f = _pw_metrics[metric]
+    if block_size is not None or memory_budget is not None:
+        return _pw_blocked(f, a, b, block_size, memory_budget)
+    else:
+        return f(a) if b is None else f(a, b)
+
+
+@dispatch
+def pw_metric(
+    a,
+    b,
+    metric: str = "euclidean",
+    *,
+    chol=None,
+    block_size=None,
+    memory_budget=None,
+):
+    """Compute a metric between all pairs of rows of two matrices where rows
+    correspond to elements and columns to features.
+
+    The following metrics are available:
+
+    * `"euclidean"`: Euclidean distance.
+    * `"sqeuclidean"`: Square of the Euclidean distance.
+    * `"cosine"`: Cosine similarity.
+    * `"manhattan"`: Manhattan distance.
+    * `"mahalanobis"`: Mahalanobis distance for the covariance `chol chol^T`.
+
+    Args:
+        a (matrix): First matrix.
+        b (matrix, optional): Second matrix. Defaults to `a`, in which case the
+            symmetry of the result is exploited.
+        metric (str, optional): Metric. Defaults to `"euclidean"`.
+        chol (matrix, optional): Cholesky factor of the covariance for the
+            Mahalanobis distance.
+        block_size (int or tuple[int, int], optional): Compute the result in tiles
+            with this number of rows and columns to limit the size of temporaries. An
+            integer gives square tiles.
+        memory_budget (int, optional): Compute the result in tiles of at most this
+            many bytes. Only used if `block_size` is not given.
+
+    Returns:
+        matrix: Metric between all pairs of elements of `a` and `b`.
+    """
+    return _pw_metric(a, b, metric, chol, block_size, memory_budget)
+
+
+@dispatch
+def pw_metric(
+    a,
+    metric: str = "euclidean",
+    *,
+    chol=None,
+    block_size=None,
+    memory_budget=None,
+):
+    return _pw_metric(a, None, metric, chol, block_size, memory_budget)
+
+
+@dispatch
+def ew_dists2(a, b):
+    """Compute the square the Euclidean norm of the element-wise differences between
+    two matrices where rows correspond to elements and columns to features.
+
+    Args:
+        a (matrix): First matrix.
+        b (matrix, optional): Second matrix. Defaults to `a`.
+
+    Returns:
+        matrix: Square of the Euclidean norm of the element-wise differences
+            between the elements of `a` and `b`.
+    """
+    a, b = _a_b_uprank(a, b)
+    return B.sum((a - b) ** 2, axis=-1)[..., :, None]
+
+
+@dispatch
+def ew_dists2(a):
+    return ew_dists2(a, a)
 
 
 @dispatch
@@ -584,18 +2505,26 @@ def ew_dists(a):
 
 
 @dispatch
-def pw_sums2(a, b):
+def pw_sums2(a, b, *, block_size=None, memory_budget=None):
     """Compute the square the Euclidean norm of the pairwise sums between two
     matrices where rows correspond to elements and columns to features.
 
     Args:
         a (matrix): First matrix.
         b (matrix, optional): Second matrix. Defaults to `a`.
+        block_size (int or tuple[int, int], optional): Compute the result in tiles
+            with this number of rows and columns to limit the size of temporaries. An
+            integer gives square tiles.
+        memory_budget (int, optional): Compute the result in tiles of at most this
+            many bytes. Only used if `block_size` is not given.
 
     Returns:
         matrix: Square of the Euclidean norm of the pairwise sums
             between the elements of `a` and `b`.
     """
+    if block_size is not None or memory_budget is not None:
+        return _pw_blocked(pw_sums2, a, b, block_size, memory_budget)
+
     a, b = _a_b_uprank(a, b)
 
     # Optimise the one-dimensional case.
@@ -608,23 +2537,43 @@ def pw_sums2(a, b):
 
 
 @dispatch
-def pw_sums2(a):
-    return pw_sums2(a, a)
+def pw_sums2(a, *, block_size=None, memory_budget=None):
+    if block_size is not None or memory_budget is not None:
+        return _pw_blocked(pw_sums2, a, None, block_size, memory_budget)
+
+    a = B.uprank(a)
+
+    # Optimise the one-dimensional case.
+    if B.shape(a, -1) == 1:
+        return (a + B.transpose(a)) ** 2
+
+    # Multiplying `a` with itself allows NumPy to use a symmetric rank-k update.
+    gram = B.matmul(a, a, tr_b=True)
+    norms = B.diag_extract(gram)
+    return norms[..., :, None] + norms[..., None, :] + 2 * gram
 
 
 @dispatch
-def pw_sums(a, b):
+def pw_sums(a, b, *, block_size=None, memory_budget=None):
     """Compute the Euclidean norm of the pairwise sums between two
     matrices where rows correspond to elements and columns to features.
 
     Args:
         a (matrix): First matrix.
         b (matrix, optional): Second matrix. Defaults to `a`.
+        block_size (int or tuple[int, int], optional): Compute the result in tiles
+            with this number of rows and columns to limit the size of temporaries. An
+            integer gives square tiles.
+        memory_budget (int, optional): Compute the result in tiles of at most this
+            many bytes. Only used if `block_size` is not given.
 
     Returns:
         matrix: Euclidean norm of the pairwise sums between the
             elements of `a` and `b`.
     """
+    if block_size is not None or memory_budget is not None:
+        return _pw_blocked(pw_sums, a, b, block_size, memory_budget)
+
     a, b = _a_b_uprank(a, b)
 
     # Optimise the one-dimensional case.
@@ -635,8 +2584,17 @@ def pw_sums(a, b):
 
 
 @dispatch
-def pw_sums(a):
-    return pw_sums(a, a)
+def pw_sums(a, *, block_size=None, memory_budget=None):
+    if block_size is not None or memory_budget is not None:
+        return _pw_blocked(pw_sums, a, None, block_size, memory_budget)
+
+    a = B.uprank(a)
+
+    # Optimise the one-dimensional case.
+    if B.shape(a, -1) == 1:
+        return B.abs(a + B.transpose(a))
+
+    return B.sqrt(B.maximum(B.pw_sums2(a), B.cast(B.dtype(a), 1e-30)))
 
 
 @dispatch
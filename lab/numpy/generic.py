@@ -1,5 +1,5 @@
 from types import FunctionType
-from typing import Union
+from typing import Optional, Union
 
 import numpy as np
 import scipy.special as sps
@@ -43,6 +43,26 @@ def imag(a: Numeric):
     return np.imag(a)
 
 
+@dispatch
+def fft(a: Numeric, axis: Int = -1):
+    return np.fft.fft(a, axis=axis)
+
+
+@dispatch
+def ifft(a: Numeric, axis: Int = -1):
+    return np.fft.ifft(a, axis=axis)
+
+
+@dispatch
+def rfft(a: Numeric, axis: Int = -1):
+    return np.fft.rfft(a, axis=axis)
+
+
+@dispatch
+def irfft(a: Numeric, n: Optional[Int] = None, axis: Int = -1):
+    return np.fft.irfft(a, n=n, axis=axis)
+
+
 @dispatch
 def device(a: NPNumeric):
     return "cpu"
@@ -1,4 +1,5 @@
 import logging
+from types import FunctionType
 from typing import Optional, Union
 
 import numpy as np
@@ -8,11 +9,26 @@ import scipy.linalg as sla
 from ..custom import expm as _expm
 from ..custom import logm as _logm
 from ..custom import toeplitz_solve as _toeplitz_solve
+from ..linear_algebra import _cholesky_ex as _cholesky_ex_generic
 from ..linear_algebra import _default_perm
 from ..types import Int
 from ..util import batch_computation
 from . import B, Numeric, dispatch
 
+try:
+    # noinspection PyUnresolvedReferences
+    from ..lapack import potrf as _potrf
+    from ..lapack import potri as _potri
+    from ..lapack import potrs as _potrs
+    from ..lapack import trtrs as _trtrs
+except ImportError:  # pragma: no cover
+    # The batched LAPACK routines were not compiled. Fall back to handling the
+    # matrices one by one.
+    _potrf = None
+    _potri = None
+    _potrs = None
+    _trtrs = None
+
 __all__ = []
 
 log = logging.getLogger(__name__)
@@ -55,10 +71,24 @@ def svd(a: Numeric, compute_uv: bool = True):
     return (res[0], res[1], np.conj(transpose(res[2]))) if compute_uv else res
 
 
+@dispatch
+def svdvals(a: Numeric):
+    return np.linalg.svd(a, compute_uv=False)
+
+
 @dispatch
 def eig(a: Numeric, compute_eigvecs: bool = True):
-    vals, vecs = np.linalg.eig(a)
-    return (vals, vecs) if compute_eigvecs else vals
+    return np.linalg.eig(a) if compute_eigvecs else np.linalg.eigvals(a)
+
+
+@dispatch
+def eigvals(a: Numeric):
+    return np.linalg.eigvals(a)
+
+
+@dispatch
+def eigh(a: Numeric, compute_eigvecs: bool = True):
+    return np.linalg.eigh(a) if compute_eigvecs else np.linalg.eigvalsh(a)
 
 
 @dispatch
@@ -96,21 +126,114 @@ def _cholesky(a: Numeric):
     return np.linalg.cholesky(a)
 
 
+@dispatch
+def _cholesky_ex(a: Numeric):
+    if _potrf is None or a.dtype not in (np.float32, np.float64):
+        return _cholesky_ex_generic(a)
+    chol = np.array(a, order="C")
+    info = _potrf(chol)
+    return chol, info > 0
+
+
+def _batched_lapack_solve(routine, a, b, *args):
+    """Solve a batch of linear systems with one call to a compiled batched LAPACK
+    routine.
+
+    Args:
+        routine (function or None): Batched LAPACK routine from :mod:`lab.lapack`.
+        a (tensor): Batch of matrices, which may be broadcasted.
+        b (tensor): Batch of right-hand sides, which may be broadcasted.
+        *args (object): Further arguments to `routine`.
+
+    Returns:
+        tensor or None: Solutions, or `None` if the routine is not available or cannot
+            handle the arguments.
+    """
+    if routine is None or B.rank(a) < 2 or B.rank(b) < 2:
+        return None
+    dtype = np.promote_types(a.dtype, b.dtype)
+    if dtype not in (np.float32, np.float64):
+        return None
+
+    n, k = a.shape[-1], b.shape[-1]
+    if a.shape[-2] != n or b.shape[-2] != n:
+        raise ValueError(
+            f"Shapes of a {a.shape} and b {b.shape} are incompatible: `a` must be "
+            f"square and `b` must have as many rows as `a`."
+        )
+    batch_shape = np.broadcast_shapes(a.shape[:-2], b.shape[:-2])
+
+    # Rather than broadcasting `a`, which might copy it, let every system point to
+    # its matrix.
+    a_batch_shape = a.shape[:-2]
+    a_index = np.arange(int(np.prod(a_batch_shape)), dtype=np.int64)
+    a_index = np.broadcast_to(a_index.reshape(a_batch_shape), batch_shape).ravel()
+    a = np.ascontiguousarray(a, dtype=dtype).reshape(-1, n, n)
+
+    # LAPACK overwrites the right-hand sides with the solutions, so a copy must be
+    # made anyway. Store the right-hand sides in the column-major order that LAPACK
+    # expects.
+    x = np.empty(batch_shape + (k, n), dtype=dtype)
+    x[...] = np.swapaxes(b, -1, -2)
+
+    info = routine(a, a_index, x.reshape(-1, k, n), *args)
+    if np.any(info > 0):
+        raise np.linalg.LinAlgError("Singular matrix.")
+
+    return np.swapaxes(x, -1, -2)
+
+
 @dispatch
 def cholesky_solve(a: Numeric, b: Numeric):
-    return triangular_solve(transpose(a), triangular_solve(a, b), lower_a=False)
+    res = _batched_lapack_solve(_potrs, a, b)
+    if res is None:
+        res = triangular_solve(transpose(a), triangular_solve(a, b), lower_a=False)
+    return res
+
+
+@dispatch
+def cholesky_inverse(a: Numeric):
+    if _potri is None or B.rank(a) < 2 or a.dtype not in (np.float32, np.float64):
+        return cholesky_solve(a, B.eye(a))
+    # LAPACK overwrites the factor with the inverse, so make a copy.
+    res = np.array(a, order="C")
+    info = _potri(res.reshape(-1, *res.shape[-2:]))
+    if np.any(info > 0):
+        raise np.linalg.LinAlgError("Singular matrix.")
+    return res
 
 
 @dispatch
 def triangular_solve(a: Numeric, b: Numeric, lower_a: bool = True):
+    res = _batched_lapack_solve(_trtrs, a, b, lower_a)
+    if res is not None:
+        return res
+
     def _triangular_solve(a_, b_):
         return sla.solve_triangular(
             a_, b_, trans="N", lower=lower_a, check_finite=False
         )
 
+    # There is no batched triangular solve to use as a vectorised implementation.
     return batch_computation(_triangular_solve, (a, b), (2, 2))
 
 
 @dispatch
 def toeplitz_solve(a: Numeric, b: Numeric, c: Numeric):
     return _toeplitz_solve(a, b, c)
+
+
+@dispatch
+def _smallest_k(a: Numeric, k: Int):
+    if k < a.shape[-1]:
+        # Find the `k` smallest elements in linear time and only sort those.
+        indices = np.argpartition(a, k - 1, axis=-1)[..., :k]
+        order = np.argsort(np.take_along_axis(a, indices, axis=-1), axis=-1)
+        return np.take_along_axis(indices, order, axis=-1)
+    else:
+        return np.argsort(a, axis=-1)
+
+
+@dispatch
+def _cg_solve_implicit(a: Numeric, b: Numeric, solve: FunctionType):
+    return solve(a, b)
@@ -1,11 +1,13 @@
 from types import FunctionType
-from typing import Callable, Union
+from typing import Callable, Optional, Union
 
 import tensorflow as tf
 import tensorflow_probability as tfp
 
 from ..custom import bvn_cdf, s_bvn_cdf
+from ..generic import _as_state
 from ..types import Int, TFDType, TFRandomState
+from ..util import resolve_axis
 from . import B, Numeric, TFNumeric, dispatch
 from .custom import tensorflow_register
 
@@ -53,6 +55,42 @@ def imag(a: Numeric):
     return tf.math.imag(a)
 
 
+def _on_last_axis(f, a, axis):
+    # TensorFlow only computes Fourier transforms along the last axis.
+    axis = resolve_axis(a, axis)
+    perm = list(range(B.rank(a)))
+    perm[axis], perm[-1] = perm[-1], perm[axis]
+    return tf.transpose(f(tf.transpose(a, perm)), perm)
+
+
+def _complex_dtype(a):
+    return tf.complex128 if a.dtype in {tf.float64, tf.complex128} else tf.complex64
+
+
+@dispatch
+def fft(a: Numeric, axis: Int = -1):
+    a = tf.cast(a, _complex_dtype(a))
+    return _on_last_axis(tf.signal.fft, a, axis)
+
+
+@dispatch
+def ifft(a: Numeric, axis: Int = -1):
+    a = tf.cast(a, _complex_dtype(a))
+    return _on_last_axis(tf.signal.ifft, a, axis)
+
+
+@dispatch
+def rfft(a: Numeric, axis: Int = -1):
+    return _on_last_axis(tf.signal.rfft, a, axis)
+
+
+@dispatch
+def irfft(a: Numeric, n: Optional[Int] = None, axis: Int = -1):
+    if n is None:
+        n = 2 * (int(B.shape(a, axis)) - 1)
+    return _on_last_axis(lambda x: tf.signal.irfft(x, fft_length=[n]), a, axis)
+
+
 @dispatch
 def device(a: TFNumeric):
     return a.device
@@ -344,6 +382,15 @@ def _cond(condition: TFNumeric, f_true: FunctionType, f_false: FunctionType, *ar
     return tf.cond(condition, lambda: f_true(*args), lambda: f_false(*args))
 
 
+@dispatch
+def _while_loop(f_cond: FunctionType, f_body: FunctionType, *init_state: TFNumeric):
+    return tf.while_loop(
+        f_cond,
+        lambda *state: _as_state(f_body(*state)),
+        init_state,
+    )
+
+
 @dispatch
 def where(condition: Numeric, a: Numeric, b: Numeric):
     return tf.where(condition, a, b)
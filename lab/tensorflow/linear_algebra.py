@@ -1,10 +1,17 @@
+from types import FunctionType
 from typing import Optional, Union
 
+import numpy as np
 import opt_einsum as oe
 import tensorflow as tf
 
-from ..custom import expm, logm, s_expm, s_logm, s_toeplitz_solve, toeplitz_solve
-from ..linear_algebra import _default_perm
+from ..custom import logm, s_logm
+from ..linear_algebra import (
+    _default_perm,
+    _levinson_check,
+    _levinson_recursion,
+    _s_cg_solve,
+)
 from ..types import Int
 from ..util import resolve_axis
 from . import B, Numeric, dispatch
@@ -53,10 +60,24 @@ def svd(a: Numeric, compute_uv: bool = True):
     return (res[1], res[0], res[2]) if compute_uv else res
 
 
+@dispatch
+def svdvals(a: Numeric):
+    return tf.linalg.svd(a, compute_uv=False)
+
+
 @dispatch
 def eig(a: Numeric, compute_eigvecs: bool = True):
-    vals, vecs = tf.linalg.eig(a)
-    return (vals, vecs) if compute_eigvecs else vals
+    return tf.linalg.eig(a) if compute_eigvecs else tf.linalg.eigvals(a)
+
+
+@dispatch
+def eigvals(a: Numeric):
+    return tf.linalg.eigvals(a)
+
+
+@dispatch
+def eigh(a: Numeric, compute_eigvecs: bool = True):
+    return tf.linalg.eigh(a) if compute_eigvecs else tf.linalg.eigvalsh(a)
 
 
 @dispatch
@@ -79,12 +100,9 @@ def logdet(a: Numeric):
     return tf.linalg.logdet(a)
 
 
-_expm = tensorflow_register(expm, s_expm)
-
-
 @dispatch
 def expm(a: Numeric):
-    return _expm(a)
+    return tf.linalg.expm(a)
 
 
 _logm = tensorflow_register(logm, s_logm)
@@ -100,6 +118,14 @@ def _cholesky(a: Numeric):
     return tf.linalg.cholesky(a)
 
 
+@dispatch
+def _cholesky_ex(a: Numeric):
+    # TensorFlow does not raise an exception, but fills failed decompositions with
+    # NaNs.
+    chol = tf.linalg.cholesky(a)
+    return chol, np.any(np.isnan(chol.numpy()), axis=(-2, -1))
+
+
 @dispatch
 def cholesky_solve(a: Numeric, b: Numeric):
     return tf.linalg.cholesky_solve(a, b)
@@ -110,9 +136,34 @@ def triangular_solve(a: Numeric, b: Numeric, lower_a: bool = True):
     return tf.linalg.triangular_solve(a, b, lower=lower_a)
 
 
-_toeplitz_solve = tensorflow_register(toeplitz_solve, s_toeplitz_solve)
+def _fori_loop(lower, upper, body, state):
+    return tf.while_loop(
+        lambda i, state: i < upper,
+        lambda i, state: (i + 1, body(i, state)),
+        (tf.constant(lower), state),
+    )[1]
+
+
+@tf.function(autograph=False)
+def _levinson_recursion_function(a, b, c):
+    return _levinson_recursion(a, b, c, fori_loop=_fori_loop)
 
 
 @dispatch
 def toeplitz_solve(a: Numeric, b: Numeric, c: Numeric):
-    return _toeplitz_solve(a, b, c)
+    return _levinson_check(*_levinson_recursion_function(a, b, c))
+
+
+@dispatch
+def _smallest_k(a: Numeric, k: Int):
+    return tf.math.top_k(-a, k, sorted=True).indices
+
+
+@dispatch
+def _cg_solve_implicit(a: Numeric, b: Numeric, solve: FunctionType):
+    @tf.custom_gradient
+    def _solve(a, b):
+        x = solve(a, b)
+        return x, lambda s_x: _s_cg_solve(solve, s_x, x, a, b)
+
+    return _solve(a, b)
@@ -1,5 +1,5 @@
 from types import FunctionType
-from typing import Union
+from typing import Optional, Union
 
 import torch
 from torch.jit import is_tracing, trace
@@ -49,6 +49,28 @@ def imag(a: Numeric):
     return torch.imag(a)
 
 
+@dispatch
+def fft(a: Numeric, axis: Int = -1):
+    return torch.fft.fft(a, dim=axis)
+
+
+@dispatch
+def ifft(a: Numeric, axis: Int = -1):
+    # For real inputs, the result is a lazily conjugated view, which cannot be
+    # converted to NumPy.
+    return torch.fft.ifft(a, dim=axis).resolve_conj()
+
+
+@dispatch
+def rfft(a: Numeric, axis: Int = -1):
+    return torch.fft.rfft(a, dim=axis)
+
+
+@dispatch
+def irfft(a: Numeric, n: Optional[Int] = None, axis: Int = -1):
+    return torch.fft.irfft(a, n=n, dim=axis)
+
+
 @dispatch
 def device(a: TorchNumeric):
     return a.device
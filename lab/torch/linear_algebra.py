@@ -1,10 +1,16 @@
+from types import FunctionType
 from typing import Optional, Union
 
 import opt_einsum as oe
 import torch
 
-from ..custom import expm, logm, s_expm, s_logm, s_toeplitz_solve, toeplitz_solve
-from ..linear_algebra import _default_perm
+from ..custom import logm, s_logm
+from ..linear_algebra import (
+    _default_perm,
+    _levinson_check,
+    _levinson_recursion,
+    _s_cg_solve,
+)
 from ..types import Int
 from . import B, Numeric, dispatch
 from .custom import torch_register
@@ -45,14 +51,30 @@ def trace(a: Numeric, axis1: Int = -2, axis2: Int = -1):
 
 @dispatch
 def svd(a: Numeric, compute_uv: bool = True):
-    u, s, v = torch.linalg.svd(a, full_matrices=False)
-    return (u, s, v) if compute_uv else s
+    if not compute_uv:
+        return torch.linalg.svdvals(a)
+    u, s, vh = torch.linalg.svd(a, full_matrices=False)
+    return u, s, torch.conj(torch.transpose(vh, -2, -1))
+
+
+@dispatch
+def svdvals(a: Numeric):
+    return torch.linalg.svdvals(a)
 
 
 @dispatch
 def eig(a: Numeric, compute_eigvecs: bool = True):
-    vals, vecs = torch.linalg.eig(a)
-    return (vals, vecs) if compute_eigvecs else vals
+    return torch.linalg.eig(a) if compute_eigvecs else torch.linalg.eigvals(a)
+
+
+@dispatch
+def eigvals(a: Numeric):
+    return torch.linalg.eigvals(a)
+
+
+@dispatch
+def eigh(a: Numeric, compute_eigvecs: bool = True):
+    return torch.linalg.eigh(a) if compute_eigvecs else torch.linalg.eigvalsh(a)
 
 
 @dispatch
@@ -75,12 +97,9 @@ def logdet(a: Numeric):
     return torch.logdet(a)
 
 
-_expm = torch_register(expm, s_expm)
-
-
 @dispatch
 def expm(a: Numeric):
-    return _expm(a)
+    return torch.linalg.matrix_exp(a)
 
 
 _logm = torch_register(logm, s_logm)
@@ -96,19 +115,51 @@ def _cholesky(a: Numeric):
     return torch.linalg.cholesky(a)
 
 
+@dispatch
+def _cholesky_ex(a: Numeric):
+    chol, info = torch.linalg.cholesky_ex(a)
+    return chol, info.cpu().numpy() > 0
+
+
 @dispatch
 def cholesky_solve(a: Numeric, b: Numeric):
     return torch.cholesky_solve(b, a, upper=False)
 
 
+@dispatch
+def cholesky_inverse(a: Numeric):
+    return torch.cholesky_inverse(a, upper=False)
+
+
 @dispatch
 def triangular_solve(a: Numeric, b: Numeric, lower_a: bool = True):
     return torch.linalg.solve_triangular(a, b, upper=not lower_a)
 
 
-_toeplitz_solve = torch_register(toeplitz_solve, s_toeplitz_solve)
+@dispatch
+def toeplitz_solve(a: Numeric, b: Numeric, c: Numeric):
+    return _levinson_check(*_levinson_recursion(a, b, c))
 
 
 @dispatch
-def toeplitz_solve(a: Numeric, b: Numeric, c: Numeric):
-    return _toeplitz_solve(a, b, c)
+def _smallest_k(a: Numeric, k: Int):
+    return torch.topk(a, k, dim=-1, largest=False, sorted=True)[1]
+
+
+class _CGSolve(torch.autograd.Function):
+    @staticmethod
+    def forward(ctx, a, b, solve):
+        x = solve(a, b)
+        ctx.solve = solve
+        ctx.save_for_backward(x, a, b)
+        return x
+
+    @staticmethod
+    def backward(ctx, s_x):
+        s_a, s_b = _s_cg_solve(ctx.solve, s_x, *ctx.saved_tensors)
+        return s_a, s_b, None
+
+
+@dispatch
+def _cg_solve_implicit(a: Numeric, b: Numeric, solve: FunctionType):
+    return _CGSolve.apply(a, b, solve)
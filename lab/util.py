@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 
 import numpy as np
@@ -10,6 +11,7 @@ from . import B
 __all__ = [
     "resolve_axis",
     "as_tuple",
+    "batch_computation_workers",
     "batch_computation",
     "abstract",
     "compress_batch",
@@ -120,47 +122,82 @@ def _translate_index(index, batch_shape):
     return translated_index
 
 
-def batch_computation(f, xs, ranks):
+batch_computation_workers = 1
+"""int: Number of threads over which :func:`batch_computation` distributes the
+per-batch calls if no vectorised implementation is available. Threads only help if
+the function releases the GIL, which is the case for most of LAPACK."""
+
+
+def batch_computation(f, xs, ranks, vectorised=None, workers=None):
     """Apply a function over all batches of arguments.
 
+    If `vectorised` is given, the batch dimensions of all arguments are broadcasted
+    and compressed into a single leading dimension, and `vectorised` is called once.
+    Otherwise, `f` is called once for every batch. For NumPy arguments, these calls
+    write directly into a preallocated output and can be distributed over multiple
+    threads.
+
     Args:
         f (function): Function that performs the computation.
         xs (tuple): Matrices or batches of matrices.
         ranks (tuple): Ranks of the arguments.
+        vectorised (function, optional): Vectorised version of `f`, which takes in
+            arguments with exactly one batch dimension.
+        workers (int, optional): Number of threads to distribute the calls to `f`
+            over. Defaults to `.util.batch_computation_workers`.
 
     Returns:
         tensor: Result in batched form.
     """
     # Reshape arguments for batched computation.
     batch_shapes = [B.shape(x)[:-rank] for x, rank in zip(xs, ranks)]
+    core_shapes = [B.shape(x)[-rank:] for x, rank in zip(xs, ranks)]
 
-    # Find the common shape.
-    batch_shape = _common_shape(*batch_shapes)
-    # Force evaluation of the element of the shape: if the shapes are lazy or when
-    # a function is evaluated abstractly, the dimensions of the shape may still be
-    # wrapped.
-    indices = np.indices(tuple(int(x) for x in batch_shape))
+    # Find the common shape. Force evaluation of the element of the shape: if the
+    # shapes are lazy or when a function is evaluated abstractly, the dimensions of
+    # the shape may still be wrapped.
+    batch_shape = tuple(int(x) for x in _common_shape(*batch_shapes))
 
     # Handle the edge case that there is no batching.
-    if len(indices) == 0:
-        indices = [()]
+    if batch_shape == ():
+        return f(*xs)
+
+    if vectorised is not None:
+        xs = [
+            B.reshape(B.broadcast_to(x, *batch_shape, *core), -1, *core)
+            for x, core in zip(xs, core_shapes)
+        ]
+        res = vectorised(*xs)
+        return B.reshape(res, *batch_shape, *B.shape(res)[1:])
+
+    indices = list(np.ndindex(*batch_shape))
+
+    def compute(index):
+        return f(*[x[_translate_index(index, s)] for x, s in zip(xs, batch_shapes)])
+
+    # Only NumPy arrays can be written into a preallocated output.
+    if not all(isinstance(x, np.ndarray) for x in xs):
+        res = B.stack(*[compute(index) for index in indices], axis=0)
+        return B.reshape(res, *batch_shape, *B.shape(res)[1:])
+
+    first = np.asarray(compute(indices[0]))
+    res = np.empty((len(indices),) + first.shape, dtype=first.dtype)
+    res[0] = first
+
+    def compute_into(i):
+        res[i] = compute(indices[i])
+
+    if workers is None:
+        workers = batch_computation_workers
+    if workers > 1 and len(indices) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Consume the iterator to raise any exceptions.
+            list(executor.map(compute_into, range(1, len(indices))))
     else:
-        # Put the index dimension last.
-        perm = tuple(list(range(1, len(batch_shape) + 1))) + (0,)
-        indices = indices.transpose(perm)
-        # Turn into a list of indices.
-        indices = indices.reshape(-1, len(batch_shape))
-
-    # Loop over batches.
-    batches = []
-    for index in indices:
-        batches.append(
-            f(*[x[_translate_index(index, s)] for x, s in zip(xs, batch_shapes)])
-        )
-
-    # Construct result, reshape, and return.
-    res = B.stack(*batches, axis=0)
-    return B.reshape(res, *(batch_shape + B.shape(res)[1:]))
+        for i in range(1, len(indices)):
+            compute_into(i)
+
+    return res.reshape(batch_shape + first.shape)
 
 
 def abstract(promote=None, promote_from=None):
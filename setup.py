@@ -84,8 +84,25 @@ else:
         ):
             raise RuntimeError("Compilation of TVPACK failed.")
 
-    # Determine which external modules to compile.
-    ext_modules = []
+    # Determine which external modules to compile. The batched LAPACK routines only
+    # depend on SciPy and the Levinson recursion has no dependencies, so these can
+    # always be compiled.
+    ext_modules = [
+        Extension(
+            "lab.lapack",
+            sources=["lab/lapack/lapack.pyx"],
+            include_dirs=[np.get_include()],
+            extra_compile_args=["-fPIC", "-O2", "-fopenmp"],
+            extra_link_args=["-fopenmp"],
+        ),
+        Extension(
+            "lab.levinson",
+            sources=["lab/levinson/levinson.pyx"],
+            include_dirs=[np.get_include()],
+            extra_compile_args=["-fPIC", "-O2", "-fopenmp"],
+            extra_link_args=["-fopenmp"],
+        ),
+    ]
 
     if gfortran:
         extra_objects = ["lab/bvn_cdf/tvpack.o"]
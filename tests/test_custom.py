@@ -2,6 +2,7 @@ import jax
 import jax.numpy as jnp
 import numpy as np
 import pytest
+import scipy.linalg as sla
 import tensorflow as tf
 import torch
 from autograd import grad
@@ -103,6 +104,60 @@ def test_toeplitz_solve(check_lazy_shapes):
     check_grad(toeplitz_solve, (B.randn(3), B.randn(2), B.randn(3, 4)))
 
 
+def test_toeplitz_solve_batched(check_lazy_shapes):
+    a = B.randn(2, 4) + 3
+    b = B.randn(2, 3)
+    c = B.randn(3, 1, 4, 2)
+    res = np.stack(
+        [
+            np.stack(
+                [
+                    np.linalg.solve(
+                        sla.toeplitz(a[j], np.concatenate((a[j, :1], b[j]))),
+                        c[i, 0],
+                    )
+                    for j in range(2)
+                ]
+            )
+            for i in range(3)
+        ]
+    )
+    approx(toeplitz_solve(a, b, c), res)
+    approx(toeplitz_solve(a[None], b[None], c[..., 0]), res[..., 0])
+
+    # Check that read-only inputs and `float32`s work.
+    a.setflags(write=False)
+    approx(toeplitz_solve(a, b, c), res)
+    res32 = toeplitz_solve(*(x.astype(np.float32) for x in (a, b, c)))
+    assert res32.dtype == np.float32
+    approx(res32, res, rtol=1e-4)
+
+    # Check that complex systems keep their imaginary parts.
+    a_c = np.array([3, 1 + 0.1j, 0.5 + 0.2j])
+    b_c = np.array([0.4 - 0.1j, 0.2])
+    c_c = np.array([1.0, 2.0, 3.0])
+    res_c = toeplitz_solve(a_c, b_c, c_c)
+    assert res_c.dtype == np.complex128
+    approx(res_c, sla.solve_toeplitz((a_c, np.concatenate((a_c[:1], b_c))), c_c))
+
+    # Check that a singular system raises an error.
+    with pytest.raises(np.linalg.LinAlgError):
+        toeplitz_solve(np.zeros(3), np.zeros(2), np.ones(3))
+
+    # Check the sensitivities.
+    check_sensitivity(
+        toeplitz_solve,
+        s_toeplitz_solve,
+        (B.randn(2, 3) + 3, B.randn(2, 2), B.randn(1, 3)),
+    )
+    check_sensitivity(
+        toeplitz_solve,
+        s_toeplitz_solve,
+        (B.randn(3) + 3, B.randn(2, 1, 2), B.randn(2, 3, 2)),
+    )
+    check_grad(toeplitz_solve, (B.randn(2, 3) + 3, B.randn(2, 2), B.randn(2, 3, 2)))
+
+
 def test_bvn_cdf(check_lazy_shapes):
     check_sensitivity(bvn_cdf, s_bvn_cdf, (B.rand(3), B.rand(3), B.rand(3)))
     check_grad(bvn_cdf, (B.rand(3), B.rand(3), B.rand(3)))
@@ -134,6 +189,30 @@ def test_expm(check_lazy_shapes):
     check_grad(expm, (B.randn(3, 3),))
 
 
+def test_expm_batched(check_lazy_shapes):
+    # Use very different norms to exercise per-matrix scaling.
+    a = B.randn(4, 3, 3) * np.array([0, 1e-2, 1, 1e2])[:, None, None]
+    approx(expm(a), np.stack([sla.expm(a_i) for a_i in a]), rtol=1e-10)
+    check_sensitivity(expm, s_expm, (B.randn(2, 3, 3),))
+    check_sensitivity(expm, s_expm, (10 * B.randn(3, 3),))
+    check_grad(expm, (B.randn(2, 3, 3),))
+
+
+def test_expm_edge_cases(check_lazy_shapes):
+    # Integer matrices should be promoted to floating point.
+    a = np.array([[1, 2], [0, 1]])
+    res = expm(a)
+    assert res.dtype == np.float64
+    approx(res, sla.expm(a.astype(np.float64)))
+    # Non-finite elements must not give an invalid number of squarings.
+    a = np.stack([np.full((2, 2), np.nan), np.eye(2)])
+    with np.errstate(invalid="ignore"):
+        res = expm(a)
+        assert np.all(np.isnan(res[0]))
+        approx(res[1], sla.expm(np.eye(2)))
+        assert np.all(~np.isfinite(expm(np.full((2, 2), np.inf))))
+
+
 def test_logm_forward(check_lazy_shapes):
     # This test can be removed once the gradient is implemented and the below test
     # passes.
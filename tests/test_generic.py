@@ -316,6 +316,32 @@ def test_unary_complex(f, check_lazy_shapes):
     check_function(f, (ComplexTensor(2, 3),))
 
 
+@pytest.mark.parametrize("f", [B.fft, B.ifft, B.rfft])
+def test_fft(f, check_lazy_shapes):
+    check_function(f, (Tensor(4),))
+    check_function(f, (Tensor(3, 4),), {"axis": Value(0, 1, -1)})
+    check_function(f, (Tensor(2, 3, 4),), {"axis": Value(0, 1, -1)})
+    if f is not B.rfft:
+        check_function(f, (ComplexTensor(3, 4),), {"axis": Value(0, -1)})
+
+
+@pytest.mark.parametrize("n", [4, 5])
+def test_irfft(n, check_lazy_shapes):
+    x = Tensor(3, n).np()
+    for axis in [0, -1]:
+        check_function(
+            B.irfft,
+            (ComplexTensor(mat=np.fft.rfft(x, axis=axis)),),
+            {"n": Value(x.shape[axis]), "axis": Value(axis)},
+        )
+    check_function(B.irfft, (ComplexTensor(mat=np.fft.rfft(x)),), {"n": Value(n)})
+    for x_fw in Tensor(mat=x).forms():
+        approx(B.irfft(B.rfft(x_fw), n=n), x)
+        approx(B.irfft(B.rfft(x_fw, axis=0), n=3, axis=0), x)
+    # Check the default length.
+    approx(B.irfft(np.fft.rfft(x), axis=-1), np.fft.irfft(np.fft.rfft(x)))
+
+
 @pytest.mark.parametrize(
     "f",
     [
@@ -523,6 +549,45 @@ def test_cond(check_lazy_shapes):
         check_function(f, (Tensor(), Tensor(4)))
 
 
+def test_while_loop(check_lazy_shapes):
+    def f(x):
+        return B.while_loop(lambda y, i: i < 3, lambda y, i: (2 * y, i + 1), x, 0)[0]
+
+    check_function(f, (Tensor(4),))
+
+    # Check a single state variable.
+    for x in Tensor().forms():
+        res = B.while_loop(lambda y: y < 10, lambda y: y + 1, x)
+        approx(res, x + np.ceil(10 - B.to_numpy(x)))
+
+
+@pytest.mark.parametrize("t", [np.float64, tf.float64, torch.float64, jnp.float64])
+def test_while_loop_jit(t, check_lazy_shapes):
+    @B.jit
+    def f(x):
+        return B.while_loop(lambda y: B.sum(y) < 10, lambda y: 2 * y, x)
+
+    x = B.ones(t, 2)
+    if t is torch.float64:
+        # The tracing JIT of PyTorch cannot represent a data-dependent loop.
+        with pytest.raises(RuntimeError):
+            f(x)
+        return
+    approx(f(x), 8 * np.ones(2))
+    approx(f(x), 8 * np.ones(2))
+    # The number of iterations must not be fixed by the first call.
+    approx(f(x / 4), 8 * np.ones(2))
+
+
+def test_while_loop_jax_jit(check_lazy_shapes):
+    @jax.jit
+    def f(x):
+        return B.while_loop(lambda y: B.sum(y) < 10, lambda y: 2 * y, x)
+
+    approx(f(B.ones(jnp.float64, 2)), 8 * np.ones(2))
+    approx(f(B.ones(jnp.float64, 2) / 4), 8 * np.ones(2))
+
+
 def test_where(check_lazy_shapes):
     def f(v, x, y):
         return B.where(v > 0, x, y)
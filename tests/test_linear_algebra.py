@@ -1,5 +1,16 @@
+import re
+import sys
+
+import autograd
+import fdm
+import jax
+import jax.numpy as jnp
 import numpy as np
 import pytest
+import scipy.linalg
+import scipy.spatial.distance
+import tensorflow as tf
+import torch
 
 import lab as B
 
@@ -117,6 +128,39 @@ def test_kron(check_lazy_shapes):
         B.kron(Tensor(2, 3).np(), Tensor(4, 5).np(), 1)
 
 
+def test_kron_structured(check_lazy_shapes):
+    factors = [PSD(2, 2).np(), PSD(3, 3).np(), PSD(4, 4).np()]
+    k = np.kron(np.kron(*factors[:2]), factors[2])
+    x = np.random.randn(24, 5)
+    for fs_fw, x_fw in zip(
+        zip(*(Tensor(mat=f).forms() for f in factors)), Tensor(mat=x).forms()
+    ):
+        approx(B.kron_matmul(fs_fw, x_fw), k @ x)
+        approx(B.kron_solve(fs_fw, x_fw), np.linalg.solve(k, x))
+        approx(B.kron_logdet(list(fs_fw)), np.linalg.slogdet(k)[1])
+
+    # Check non-square factors.
+    factors = [np.random.randn(2, 3), np.random.randn(4, 5)]
+    x = np.random.randn(15, 2)
+    approx(B.kron_matmul(factors, x), np.kron(*factors) @ x)
+
+
+@pytest.mark.parametrize("shape", [(24,), (3, 24, 5), (2, 3, 24, 5)])
+def test_kron_structured_shapes(shape, check_lazy_shapes):
+    factors = [PSD(2, 2).np(), PSD(3, 3).np(), PSD(4, 4).np()]
+    k = np.kron(np.kron(*factors[:2]), factors[2])
+    x = np.random.randn(*shape)
+    for fs_fw, x_fw in zip(
+        zip(*(Tensor(mat=f).forms() for f in factors)), Tensor(mat=x).forms()
+    ):
+        res = B.kron_matmul(fs_fw, x_fw)
+        assert B.shape(res) == shape
+        approx(res, k @ x)
+        res = B.kron_solve(fs_fw, x_fw)
+        assert B.shape(res) == shape
+        approx(res, np.linalg.solve(k, x))
+
+
 def test_svd(check_lazy_shapes):
     # Take absolute value because the sign of the result is undetermined.
     def svd(a, compute_uv=True):
@@ -167,6 +211,61 @@ def test_eig(check_lazy_shapes):
     )
 
 
+def test_svd_reconstruction(check_lazy_shapes):
+    for a in Tensor(4, 3, 2).forms():
+        u, s, v = B.svd(a)
+        approx(B.matmul(u * B.expand_dims(s, axis=-2), v, tr_b=True), a)
+
+
+def test_svdvals(check_lazy_shapes):
+    check_function(B.svdvals, (Tensor(3, 2),))
+    check_function(B.svdvals, (Tensor(4, 3, 2),))
+    a = Tensor(4, 3, 2).np()
+    approx(B.svdvals(a), B.svd(a)[1])
+
+
+def test_eigvals(check_lazy_shapes):
+    # Use a symmetric matrix, so the eigenvalues are real and can be sorted.
+    def eigvals(a):
+        return B.sort(B.real(B.eigvals(a)))
+
+    check_function(eigvals, (PSD(3),), assert_dtype=False, skip=[B.AGNumeric])
+    check_function(eigvals, (PSD(4, 3, 3),), assert_dtype=False, skip=[B.AGNumeric])
+
+
+def test_eigh(check_lazy_shapes):
+    # Signs of eigenvectors may be different.
+    def eigh(a, compute_eigvecs=True):
+        if compute_eigvecs:
+            vals, vecs = B.eigh(a, compute_eigvecs=True)
+            return vals, B.abs(vecs)
+        else:
+            return B.eigh(a, compute_eigvecs=False)
+
+    check_function(eigh, (PSD(3),), {"compute_eigvecs": Bool()})
+    check_function(eigh, (PSD(4, 3, 3),), {"compute_eigvecs": Bool()})
+    check_function(B.eigvalsh, (PSD(4, 3, 3),))
+
+    a = PSD(4, 3, 3).np()
+    vals, vecs = B.eigh(a)
+    approx(B.matmul(vecs * vals[..., None, :], vecs, tr_b=True), a)
+    approx(B.eigvalsh(a), vals)
+    approx(vals, np.sort(np.real(np.linalg.eigvals(a)), axis=-1))
+
+
+def test_eigh_grad(check_lazy_shapes):
+    a = PSD(3).np()
+
+    def f(a):
+        return B.sum(B.sin(B.eigvalsh(a + B.transpose(a))))
+
+    approx(autograd.grad(f)(a), fdm.gradient(f)(a), atol=1e-8)
+    approx(jax.grad(f)(jnp.array(a)), fdm.gradient(f)(a), atol=1e-8)
+    a_torch = torch.tensor(a, requires_grad=True)
+    f(a_torch).backward()
+    approx(a_torch.grad, fdm.gradient(f)(a), atol=1e-8)
+
+
 def test_solve(check_lazy_shapes):
     check_function(B.solve, (Matrix(3, 3), Matrix(3, 4)))
     check_function(B.solve, (Matrix(5, 3, 3), Matrix(5, 3, 4)))
@@ -196,6 +295,31 @@ def test_logdet(check_lazy_shapes):
 
 def test_expm(check_lazy_shapes):
     check_function(B.expm, (Matrix(),))
+    check_function(B.expm, (Matrix(2, 3, 3),))
+
+
+def test_expm_grad_shares_intermediates(monkeypatch, check_lazy_shapes):
+    module = sys.modules["lab.autograd.linear_algebra"]
+    intermediates = module._expm_intermediates
+    calls = []
+
+    def counting_intermediates(a):
+        calls.append(a)
+        return intermediates(a)
+
+    monkeypatch.setattr(module, "_expm_intermediates", counting_intermediates)
+    a = Matrix(2, 3, 3).np()
+
+    def f_ref(a_i):
+        return B.sum(B.sin(scipy.linalg.expm(a_i)))
+
+    approx(
+        autograd.grad(lambda a: B.sum(B.sin(B.expm(a))))(a),
+        np.stack([fdm.gradient(f_ref)(a_i) for a_i in a]),
+        rtol=1e-6,
+    )
+    # The backward pass must not compute the intermediate results again.
+    assert len(calls) == 1
 
 
 def test_logm(check_lazy_shapes):
@@ -238,12 +362,324 @@ def test_cholesky_retry_factor(check_lazy_shapes):
     B.cholesky_retry_factor = 1
 
 
+def test_cholesky_retry_factor_batched(check_lazy_shapes):
+    B.cholesky_retry_factor = 100
+    a = np.stack(
+        [
+            B.eye(3),
+            B.zeros(3, 3) - 0.5 * B.eye(3) * 10 * B.epsilon,
+            2 * B.eye(3),
+        ],
+        axis=0,
+    )
+    for a_fw in Tensor(mat=a).forms():
+        chol, jitter = B.cholesky(a_fw, return_jitter=True)
+        # Only the jitter for the failed matrix should be increased.
+        approx(jitter, np.array([1, 10, 1]) * B.epsilon)
+        approx(chol[0], B.eye(3), atol=1e-10)
+        approx(chol[2], np.sqrt(2) * B.eye(3), atol=1e-10)
+
+    # Check the jitter in the unbatched case.
+    chol, jitter = B.cholesky(B.eye(3), return_jitter=True)
+    assert B.shape(jitter) == ()
+    approx(jitter, B.epsilon)
+
+    # Reset the factor!
+    B.cholesky_retry_factor = 1
+
+
+def test_cholesky_jitter_cache(check_lazy_shapes):
+    B.cholesky_retry_factor = 100
+    a = B.zeros(3, 3) - 0.5 * B.eye(3) * 10 * B.epsilon
+
+    with B.CholeskyJitterCache(decay=3) as cache:
+        assert B.CholeskyJitterCache.active is cache
+
+        # The first decomposition must retry.
+        with pytest.warns(UserWarning):
+            _, jitter = B.cholesky(a, return_jitter=True, jitter_key="a")
+        approx(jitter, 10 * B.epsilon)
+        assert cache.hits == 0
+        assert cache.avoided == 0
+
+        # Subsequent decompositions start from the remembered regularisation.
+        for _ in range(2):
+            _, jitter = B.cholesky(a, return_jitter=True, jitter_key="a")
+            approx(jitter, 10 * B.epsilon)
+        assert cache.hits == 2
+        assert cache.avoided == 2
+
+        # After three successes, the regularisation decays.
+        _, jitter = B.cholesky(a, return_jitter=True, jitter_key="a")
+        approx(jitter, 10 * B.epsilon)
+        with pytest.warns(UserWarning):
+            _, jitter = B.cholesky(a, return_jitter=True, jitter_key="a")
+        approx(jitter, 10 * B.epsilon)
+
+        # Other keys are not affected.
+        _, jitter = B.cholesky(B.eye(3), return_jitter=True, jitter_key="b")
+        approx(jitter, B.epsilon)
+
+        # Check that the call site is used as the default key and that batches are
+        # tracked per matrix.
+        a_batch = B.stack(B.eye(3), a, B.eye(3))
+        for i in range(2):
+            _, jitter = B.cholesky(a_batch, return_jitter=True)
+        approx(jitter, np.array([1, 10, 1]) * B.epsilon)
+        assert cache.hits == 4
+
+    assert B.CholeskyJitterCache.active is None
+    assert str(cache) == "<CholeskyJitterCache: hits=4, avoided=4>"
+
+    # Reset the factor!
+    B.cholesky_retry_factor = 1
+
+
 @pytest.mark.parametrize("f", [B.cholesky_solve, B.cholsolve])
 def test_cholesky_solve(f, check_lazy_shapes):
     check_function(f, (PSDTriangular(3, 3), Matrix(3, 4)))
     check_function(f, (PSDTriangular(5, 3, 3), Matrix(5, 3, 4)))
 
 
+def test_cholesky_inverse(check_lazy_shapes):
+    check_function(B.cholesky_inverse, (PSDTriangular(3, 3),))
+    check_function(B.cholesky_inverse, (PSDTriangular(5, 3, 3),))
+    chol = B.cholesky(PSD(2, 3, 3).np())
+    approx(B.cholesky_inverse(chol), np.linalg.inv(chol @ B.t(chol)))
+    # Check the fallback for non-floating types.
+    approx(B.cholesky_inverse(np.array([[2]])), np.array([[0.25]]))
+
+
+@pytest.mark.parametrize("batch", [(), (2,), (2, 3)])
+def test_pd(batch, check_lazy_shapes):
+    check_function(B.solve_pd, (PSD(*batch, 3, 3), Matrix(*batch, 3, 4)))
+    check_function(B.inv_pd, (PSD(*batch, 3, 3),))
+    check_function(B.logdet_pd, (PSD(*batch, 3, 3),))
+    # Keep the matrix well conditioned to compare against NumPy.
+    a = PSD(*batch, 3, 3).np() + np.eye(3)
+    b = np.random.randn(*batch, 3, 4)
+    approx(B.solve_pd(a, b), np.linalg.solve(a, b))
+    approx(B.inv_pd(a), np.linalg.inv(a))
+    approx(B.logdet_pd(a), np.linalg.slogdet(a)[1])
+
+
+@pytest.mark.parametrize("f", [B.solve_refined, B.solve_pd_refined])
+@pytest.mark.parametrize("batch", [(), (2,)])
+def test_solve_refined(f, batch, check_lazy_shapes):
+    a = PSD(*batch, 10, 10).np() + B.eye(10)
+    b = np.random.randn(*batch, 10, 3)
+    x = np.linalg.solve(a, b)
+    for a_fw, b_fw in zip(Tensor(mat=a).forms(), Tensor(mat=b).forms()):
+        res = f(a_fw, b_fw)
+        assert B.dtype(res) == B.dtype(a_fw)
+        approx(res, x, atol=1e-12, rtol=1e-10)
+        # Without refinement, the result only has single precision.
+        res = f(a_fw, b_fw, iters=0)
+        assert B.dtype(res) == B.dtype(a_fw)
+        approx(res, x, atol=1e-3, rtol=1e-3)
+    # Check specifying the data types.
+    res = f(a, b, np.float32, np.float32)
+    assert B.dtype(res) == np.float32
+    approx(res, x, atol=1e-3, rtol=1e-3)
+
+
+@pytest.mark.parametrize("batch", [(), (2,), (2, 3)])
+def test_cholesky_factor(batch, check_lazy_shapes):
+    a = PSD(*batch, 4, 4).np()
+    b = np.random.randn(*batch, 4, 2)
+    c = np.random.randn(*batch, 4, 3)
+    for a_fw, b_fw, c_fw in zip(
+        Tensor(mat=a).forms(), Tensor(mat=b).forms(), Tensor(mat=c).forms()
+    ):
+        factor = B.cholesky_factor(a_fw)
+        assert isinstance(factor, B.CholeskyFactor)
+        # The decomposition is regularised, so compare against the regularised matrix.
+        chol = B.cholesky(a)
+        a_reg = chol @ B.t(chol)
+        approx(factor.chol, chol)
+        approx(factor.solve(b_fw), np.linalg.solve(a_reg, b))
+        approx(factor.logdet(), np.linalg.slogdet(a_reg)[1])
+        approx(factor.inv(), np.linalg.inv(a_reg))
+        approx(factor.quad_form(b_fw), B.t(b) @ np.linalg.solve(a_reg, b))
+        approx(factor.quad_form(b_fw, c_fw), B.t(b) @ np.linalg.solve(a_reg, c))
+        approx(factor.matmul(b_fw), a @ b)
+
+        # Check that derived quantities are cached.
+        assert factor.logdet() is factor.logdet()
+        assert factor.inv() is factor.inv()
+
+        # Check sampling.
+        assert B.shape(factor.sample()) == (*batch, 4, 1)
+        assert B.shape(factor.sample(5)) == (*batch, 4, 5)
+        state = B.create_random_state(B.dtype(a_fw), seed=0)
+        state, sample = factor.sample(state, 5)
+        assert B.shape(sample) == (*batch, 4, 5)
+
+
+@pytest.mark.parametrize("batch", [(), (2,)])
+@pytest.mark.parametrize("rank", [None, 1, 3])
+@pytest.mark.parametrize("downdate", [False, True])
+def test_cholesky_update(batch, rank, downdate, check_lazy_shapes):
+    if rank is None:
+        v = 0.1 * np.random.randn(*batch, 4)
+        vvT = v[..., :, None] * v[..., None, :]
+    else:
+        v = 0.1 * np.random.randn(*batch, 4, rank)
+        vvT = v @ B.t(v)
+    k = PSD(*batch, 4, 4).np() + np.eye(4)
+    k_updated = k - vvT if downdate else k + vvT
+    for a_fw, v_fw in zip(
+        Tensor(mat=np.linalg.cholesky(k)).forms(), Tensor(mat=v).forms()
+    ):
+        approx(
+            B.cholesky_update(a_fw, v_fw, downdate=downdate),
+            np.linalg.cholesky(k_updated),
+        )
+
+
+def test_cholesky_update_broadcast(check_lazy_shapes):
+    k = PSD(2, 4, 4).np() + np.eye(4)
+    a = np.linalg.cholesky(k)
+    # Update a batch of factors with one vector and with one matrix.
+    v = 0.1 * np.random.randn(4)
+    approx(B.cholesky_update(a, v), np.linalg.cholesky(k + np.outer(v, v)))
+    v = 0.1 * np.random.randn(4, 3)
+    approx(B.cholesky_update(a, v), np.linalg.cholesky(k + v @ v.T))
+    # Update one factor with a batch of vectors, which must be given as matrices.
+    v = 0.1 * np.random.randn(2, 4, 1)
+    approx(B.cholesky_update(a[0], v), np.linalg.cholesky(k[0] + v @ B.t(v)))
+    with pytest.raises(ValueError):
+        B.cholesky_update(a, np.ones(3))
+
+
+def test_cholesky_update_grad(check_lazy_shapes):
+    a = np.linalg.cholesky(PSD(4, 4).np() + np.eye(4))
+    v = 0.1 * np.random.randn(4, 2)
+
+    def f(v):
+        return B.sum(B.cholesky_update(a, v))
+
+    approx(autograd.grad(f)(v), fdm.gradient(f)(v), rtol=1e-6)
+    approx(jax.grad(f)(jnp.array(v)), fdm.gradient(f)(v), rtol=1e-6)
+
+
+@pytest.mark.parametrize("batch", [(), (2,)])
+def test_cholesky_append(batch, check_lazy_shapes):
+    k = PSD(*batch, 6, 6).np()
+    for k_fw in Tensor(mat=k).forms():
+        a = B.cholesky(k_fw[..., :4, :4])
+        a_appended = B.cholesky_append(a, k_fw[..., :4, 4:], k_fw[..., 4:, 4:])
+        approx(a_appended, B.cholesky(k), atol=1e-8)
+
+
+@pytest.mark.parametrize("batch", [(), (2,)])
+@pytest.mark.parametrize("indices", [0, 5, -1, (1,), [4, 1], (0, 2, 5)])
+def test_cholesky_remove(batch, indices, check_lazy_shapes):
+    k = PSD(*batch, 6, 6).np()
+    keep = np.delete(np.arange(6), np.array(indices) % 6)
+    k_removed = k[..., keep, :][..., :, keep]
+    for a_fw in Tensor(mat=np.linalg.cholesky(k)).forms():
+        approx(B.cholesky_remove(a_fw, indices), np.linalg.cholesky(k_removed))
+
+
+@pytest.mark.parametrize("batch", [(), (2,)])
+def test_pivoted_cholesky(batch, check_lazy_shapes):
+    # Construct a matrix of rank three.
+    v = np.random.randn(*batch, 6, 3)
+    k = v @ np.swapaxes(v, -1, -2)
+    for k_fw in Tensor(mat=k).forms():
+        l = B.pivoted_cholesky(k_fw, 4)
+        assert B.shape(l) == batch + (6, 4)
+        approx(B.matmul(l, l, tr_b=True), k, atol=1e-8)
+        # The matrix is exhausted after three columns.
+        approx(l[..., 3], np.zeros(batch + (6,)), atol=1e-6)
+
+    # Check stopping early.
+    l = B.pivoted_cholesky(k + 1e-12 * np.eye(6), 6, tol=1e-8)
+    assert B.shape(l) == batch + (6, 3)
+
+    # Check that no columns can be produced.
+    assert B.shape(B.pivoted_cholesky(k, 0)) == batch + (6, 0)
+    assert B.shape(B.pivoted_cholesky(k, 3, tol=1e10)) == batch + (6, 0)
+
+    # Check a function which returns columns.
+    def column(i):
+        return np.take_along_axis(k, i[..., None, None], axis=-2)[..., 0, :]
+
+    approx(
+        B.pivoted_cholesky((B.diag_extract(k), column), 2),
+        B.pivoted_cholesky(k, 2),
+    )
+
+
+@pytest.mark.parametrize("t", [np.float64, tf.float64, torch.float64, jnp.float64])
+def test_pivoted_cholesky_jit(t, check_lazy_shapes):
+    @B.jit
+    def f(k):
+        return B.pivoted_cholesky(k, 4, tol=1e-8)
+
+    # Under JIT compilation, the factor always has full width.
+    v = np.random.randn(6, 2)
+    k = B.cast(t, v @ v.T)
+    for _ in range(2):
+        l = f(k)
+        assert B.shape(l) == (6, 4)
+        approx(B.matmul(l, l, tr_b=True), k, atol=1e-8)
+
+
+@pytest.mark.parametrize("batch", [(), (2,)])
+def test_nystrom(batch, check_lazy_shapes):
+    k = PSD(*batch, 6, 6).np()
+    indices = [1, 4]
+    for k_fw in Tensor(mat=k).forms():
+        l = B.nystrom(k_fw, indices)
+        assert B.shape(l) == batch + (6, 2)
+        # The approximation is exact for the inducing columns.
+        approx(
+            B.take(B.matmul(l, l, tr_b=True), indices, axis=-1),
+            k[..., indices],
+            atol=1e-8,
+        )
+    approx(B.nystrom(lambda i: k[..., i], indices), B.nystrom(k, indices))
+
+
+@pytest.mark.parametrize("batch", [(), (2,)])
+def test_lowrank(batch, check_lazy_shapes):
+    d = np.random.rand(*batch, 5) + 1
+    u = np.random.randn(*batch, 5, 2)
+    s = PSD(*batch, 2, 2).np()
+    b = np.random.randn(*batch, 5, 3)
+    k = np.eye(5) * d[..., None] + u @ s @ B.t(u)
+    for d_fw, u_fw, s_fw, b_fw in zip(
+        Tensor(mat=d).forms(),
+        Tensor(mat=u).forms(),
+        Tensor(mat=s).forms(),
+        Tensor(mat=b).forms(),
+    ):
+        approx(B.lowrank_solve(d_fw, u_fw, s_fw, b_fw), np.linalg.solve(k, b))
+        approx(B.lowrank_logdet(d_fw, u_fw, s_fw), np.linalg.slogdet(k)[1])
+        # Check a vector right-hand side.
+        res = B.lowrank_solve(d_fw, u_fw, s_fw, b_fw[..., 0])
+        assert B.shape(res) == batch + (5,)
+        approx(res, np.linalg.solve(k, b)[..., 0])
+
+
+def test_lowrank_grad(check_lazy_shapes):
+    d = np.random.rand(5) + 1
+    u = np.random.randn(5, 2)
+    s = PSD(2, 2).np()
+    b = np.random.randn(5, 3)
+
+    def f_d(d):
+        return B.sum(B.lowrank_solve(d, u, s, b)) + B.lowrank_logdet(d, u, s)
+
+    def f_u(u):
+        return B.sum(B.lowrank_solve(d, u, s, b)) + B.lowrank_logdet(d, u, s)
+
+    approx(autograd.grad(f_d)(d), fdm.gradient(f_d)(d), rtol=1e-6)
+    approx(autograd.grad(f_u)(u), fdm.gradient(f_u)(u), rtol=1e-6)
+
+
 @pytest.mark.parametrize("f", [B.triangular_solve, B.trisolve])
 def test_triangular_solve(f, check_lazy_shapes):
     check_function(f, (PSDTriangular(3, 3), Matrix(3, 4)), {"lower_a": Value(True)})
@@ -260,10 +696,340 @@ def test_triangular_solve(f, check_lazy_shapes):
     )
 
 
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("batch_a,batch_b", [((), (3,)), ((2, 1), (3,)), ((2, 3), ())])
+def test_solve_batched_broadcasting(dtype, batch_a, batch_b, check_lazy_shapes):
+    a = B.cast(dtype, np.tril(PSD(*batch_a, 4, 4).np()))
+    b = B.cast(dtype, Matrix(*batch_b, 4, 2).np())
+    tol = 1e-4 if dtype == np.float32 else 1e-7
+
+    res = B.triangular_solve(a, b)
+    assert B.dtype(res) == dtype
+    approx(B.matmul(a, res), b + B.zeros(res), rtol=tol, atol=tol)
+
+    res = B.triangular_solve(B.transpose(a), b, lower_a=False)
+    approx(B.matmul(a, res, tr_a=True), b + B.zeros(res), rtol=tol, atol=tol)
+
+    res = B.cholesky_solve(a, b)
+    approx(B.matmul(a, B.matmul(a, res, tr_a=True)), b + B.zeros(res), atol=tol)
+
+    # Check that singular systems are detected.
+    with pytest.raises(np.linalg.LinAlgError):
+        B.triangular_solve(B.zeros(a), b)
+
+
+@pytest.mark.parametrize("f", [B.triangular_solve, B.cholesky_solve])
+def test_solve_batched_incompatible_shapes(f, check_lazy_shapes):
+    a = np.tril(PSD(3, 3).np())
+    # The right-hand side has the wrong number of rows.
+    with pytest.raises(ValueError):
+        f(a, np.ones((1, 2)))
+    # The matrix is not square.
+    with pytest.raises(ValueError):
+        f(np.ones((4, 2)), np.ones((2, 2)))
+
+
 @pytest.mark.parametrize("f", [B.toeplitz_solve, B.toepsolve])
 def test_toeplitz_solve(f, check_lazy_shapes):
     check_function(f, (Tensor(3), Tensor(2), Matrix(3, 4)))
     check_function(f, (Tensor(3), Matrix(3, 4)))
+    check_function(f, (Tensor(2, 3), Tensor(2, 2), Matrix(2, 3, 4)))
+    check_function(f, (Tensor(2, 3), Tensor(2, 3)))
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        # The leading element is zero.
+        (np.array([0.0, 1.0, 0.5]), np.array([1.0, 0.3])),
+        # The leading two-by-two minor is singular.
+        (np.array([1.0, 1.0, 0.5]), np.array([1.0, 0.3])),
+    ],
+)
+def test_toeplitz_solve_singular(a, b, check_lazy_shapes):
+    c = np.ones((3, 2))
+    for a_fw, b_fw, c_fw in zip(
+        Tensor(mat=a).forms(), Tensor(mat=b).forms(), Tensor(mat=c).forms()
+    ):
+        with pytest.raises(np.linalg.LinAlgError):
+            B.toeplitz_solve(a_fw, b_fw, c_fw)
+
+
+def test_toeplitz_solve_jit(check_lazy_shapes):
+    a = B.randn(2, 5) + 3
+    b = B.randn(2, 4)
+    c = B.randn(2, 5, 3)
+    res = B.toeplitz_solve(a, b, c)
+    # The native implementations should also run under JIT compilation.
+    for a_fw, b_fw, c_fw in [
+        (jnp.array(a), jnp.array(b), jnp.array(c)),
+        (tf.constant(a), tf.constant(b), tf.constant(c)),
+    ]:
+        approx(B.jit(B.toeplitz_solve)(a_fw, b_fw, c_fw), res)
+
+
+def test_toeplitz_solve_compiled_size(check_lazy_shapes):
+    # The recursion must compile to a loop rather than be unrolled, so the size of the
+    # compiled program must not depend on the size of the system.
+    def jax_size(n):
+        a, b, c = jnp.ones(n), jnp.ones(n - 1), jnp.ones((n, 2))
+        jaxpr = str(jax.make_jaxpr(B.toeplitz_solve)(a, b, c))
+        # Remove the shapes.
+        return re.sub(r"\d+", "", jaxpr)
+
+    assert jax_size(10) == jax_size(100)
+
+    def tf_size(n):
+        a, b, c = tf.ones(n), tf.ones(n - 1), tf.ones((n, 2))
+        f = tf.function(B.toeplitz_solve, autograph=False)
+        graph = f.get_concrete_function(a, b, c).graph.as_graph_def()
+        return len(graph.node) + sum(len(f.node_def) for f in graph.library.function)
+
+    assert tf_size(10) == tf_size(100)
+
+
+def _toeplitz(a, b):
+    return scipy.linalg.toeplitz(a, np.concatenate((a[:1], b)))
+
+
+@pytest.mark.parametrize("n", [1, 4, 5])
+def test_toeplitz_matmul(n, check_lazy_shapes):
+    a = Tensor(n).np()
+    b = Tensor(n - 1).np()
+    x = Matrix(n, 3).np()
+    check_function(B.toeplitz_matmul, (Tensor(mat=a), Tensor(mat=b), Tensor(mat=x)))
+    approx(B.toeplitz_matmul(a, b, x), _toeplitz(a, b) @ x)
+    approx(B.toeplitz_matmul(a, b, x[:, 0]), _toeplitz(a, b) @ x[:, 0])
+    approx(B.toeplitz_matmul(a, x), _toeplitz(a, a[1:]) @ x)
+
+    # Check batching.
+    a = Tensor(2, n).np()
+    b = Tensor(2, n - 1).np()
+    x = Matrix(2, n, 3).np()
+    res = np.stack([_toeplitz(a[i], b[i]) @ x[i] for i in range(2)])
+    for a_fw, b_fw, x_fw in zip(
+        Tensor(mat=a).forms(), Tensor(mat=b).forms(), Tensor(mat=x).forms()
+    ):
+        approx(B.toeplitz_matmul(a_fw, b_fw, x_fw), res)
+
+
+def test_toeplitz_matmul_grad(check_lazy_shapes):
+    a, b, x = np.random.randn(5), np.random.randn(4), np.random.randn(5, 2)
+
+    def f(a):
+        return B.sum(B.sin(B.toeplitz_matmul(a, b, x)))
+
+    approx(autograd.grad(f)(a), fdm.gradient(f)(a), rtol=1e-6)
+    approx(jax.grad(f)(jnp.array(a)), fdm.gradient(f)(a), rtol=1e-6)
+    a_torch = torch.tensor(a, requires_grad=True)
+    f(a_torch).backward()
+    approx(a_torch.grad, fdm.gradient(f)(a), rtol=1e-6)
+
+
+def _cg_solve(a, b):
+    return B.cg_solve(a, b, tol=1e-12)
+
+
+def test_cg_solve(check_lazy_shapes):
+    a = PSD(6).np() + 6 * np.eye(6)
+    b = Matrix(6, 3).np()
+    for a_fw, b_fw in zip(Matrix(mat=a).forms(), Matrix(mat=b).forms()):
+        approx(_cg_solve(a_fw, b_fw), np.linalg.solve(a, b))
+        approx(_cg_solve(a_fw, b_fw[:, 0]), np.linalg.solve(a, b[:, 0]))
+
+    # Check a function as the matrix, and a preconditioner.
+    approx(_cg_solve(lambda x: a @ x, b), np.linalg.solve(a, b))
+    approx(
+        B.cg_solve(a, b, precond=np.diag(1 / np.diag(a)), tol=1e-12),
+        np.linalg.solve(a, b),
+    )
+
+    # Check batching.
+    a = PSD(2, 6, 6).np() + 6 * np.eye(6)
+    b = Matrix(2, 6, 3).np()
+    approx(_cg_solve(a, b), np.linalg.solve(a, b))
+
+    # A zero column converges immediately, and `maxiter` must be respected.
+    b[0, :, 1] = 0
+    approx(_cg_solve(a, b)[0, :, 1], np.zeros(6))
+    calls = []
+
+    def matvec(x):
+        calls.append(x)
+        return a @ x
+
+    B.cg_solve(matvec, b, maxiter=2)
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("t", [np.float64, tf.float64, torch.float64, jnp.float64])
+def test_cg_solve_jit(t, check_lazy_shapes):
+    a = B.cast(t, PSD(5).np() + 5 * np.eye(5))
+    b = B.cast(t, Matrix(5, 2).np())
+    if t is torch.float64:
+        # The tracing JIT of PyTorch cannot represent a data-dependent loop.
+        with pytest.raises(RuntimeError):
+            B.jit(_cg_solve)(a, b)
+        return
+    f = B.jit(_cg_solve)
+    approx(f(a, b), B.solve(a, b))
+    # A second system must not reuse the number of iterations of the first.
+    a2 = B.cast(t, PSD(5).np() + np.eye(5))
+    approx(f(a2, b), B.solve(a2, b))
+
+
+def test_cg_solve_grad(check_lazy_shapes):
+    # Let the right-hand side have a batch dimension to check the reduction of the
+    # gradient with respect to `a`.
+    a = PSD(4).np() + 4 * np.eye(4)
+    b = Matrix(3, 4, 2).np()
+
+    def f(a, b):
+        return B.sum(B.sin(_cg_solve(a, b)))
+
+    def f_ref(a, b):
+        return B.sum(B.sin(np.linalg.solve(a, b)))
+
+    s_a = fdm.gradient(lambda a: f_ref(a, b))(a)
+    s_b = fdm.gradient(lambda b: f_ref(a, b))(b)
+
+    approx(autograd.grad(f, 0)(a, b), s_a, rtol=1e-6)
+    approx(autograd.grad(f, 1)(a, b), s_b, rtol=1e-6)
+
+    a_jax, b_jax = jnp.array(a), jnp.array(b)
+    for grad in [jax.grad(f, (0, 1)), jax.jit(jax.grad(f, (0, 1)))]:
+        res_a, res_b = grad(a_jax, b_jax)
+        approx(res_a, s_a, rtol=1e-6)
+        approx(res_b, s_b, rtol=1e-6)
+
+    a_tf, b_tf = tf.constant(a), tf.constant(b)
+    with tf.GradientTape() as tape:
+        tape.watch((a_tf, b_tf))
+        y = f(a_tf, b_tf)
+    res_a, res_b = tape.gradient(y, (a_tf, b_tf))
+    approx(res_a, s_a, rtol=1e-6)
+    approx(res_b, s_b, rtol=1e-6)
+
+    a_torch = torch.tensor(a, requires_grad=True)
+    b_torch = torch.tensor(b, requires_grad=True)
+    f(a_torch, b_torch).backward()
+    approx(a_torch.grad, s_a, rtol=1e-6)
+    approx(b_torch.grad, s_b, rtol=1e-6)
+
+    # If `a` is a function, the gradient is computed through the iterations.
+    approx(autograd.grad(lambda b: f(lambda x: a @ x, b))(b), s_b, rtol=1e-6)
+
+
+@pytest.mark.parametrize("method", ["hutchinson", "hutch++"])
+def test_trace_estimate(method, check_lazy_shapes):
+    a = PSD(2, 6, 6).np()
+    for a_fw in Matrix(mat=a).forms():
+        # The estimates must be reproducible.
+        state = B.create_random_state(B.dtype(a_fw), seed=0)
+        state, est1 = B.trace_estimate(state, a_fw, 6, 4, method=method)
+        assert B.shape(est1) == (2,)
+        state = B.create_random_state(B.dtype(a_fw), seed=0)
+        state, est2 = B.trace_estimate(state, a_fw, 6, 4, method=method)
+        approx(est1, est2)
+
+    # Check unbiasedness. Fix the seed to make the check deterministic.
+    state = B.create_random_state(np.float64, seed=0)
+    ests = []
+    for _ in range(200):
+        state, est = B.trace_estimate(state, a, 6, method=method)
+        ests.append(est)
+    est = B.mean(B.stack(*ests), axis=0)
+    approx(est, np.trace(a, axis1=-2, axis2=-1), rtol=0.1)
+
+    # Check the estimates for a diagonal matrix and a function.
+    approx(B.trace_estimate(lambda x: 2 * x, 6, method=method), 12)
+
+
+def test_trace_estimate_hutchpp_exact(check_lazy_shapes):
+    # If the sketch spans the whole space, then Hutch++ is exact.
+    a = PSD(6).np()
+    approx(B.trace_estimate(a, 6, 18), np.trace(a))
+    approx(B.trace_estimate(a, 6, 18, dtype=np.float64), np.trace(a))
+    with pytest.raises(ValueError):
+        B.trace_estimate(a, 6, method="unknown")
+
+
+def test_logdet_estimate(check_lazy_shapes):
+    # With as many Lanczos iterations as the size of the matrix, stochastic Lanczos
+    # quadrature is exact for diagonal matrices.
+    d = np.random.rand(2, 6) + 0.1
+    a = d[..., None] * np.eye(6)
+    for a_fw in Matrix(mat=a).forms():
+        state = B.create_random_state(B.dtype(a_fw), seed=0)
+        state, est = B.logdet_estimate(state, a_fw, 6, 2, num_steps=6)
+        approx(est, np.sum(np.log(d), axis=-1))
+    approx(B.logdet_estimate(lambda x: 2 * x, 6), 6 * np.log(2))
+
+    # Check a general matrix.
+    a = PSD(6).np() + np.eye(6)
+    state = B.create_random_state(np.float64, seed=0)
+    ests = []
+    for _ in range(50):
+        state, est = B.logdet_estimate(state, a, 6)
+        ests.append(est)
+    est = B.mean(B.stack(*ests))
+    approx(est, np.linalg.slogdet(a)[1], rtol=0.1)
+
+
+def _low_rank(*shape):
+    # Construct a matrix with singular values `1, 1/2, 1/4, ...` and known singular
+    # vectors.
+    u = np.linalg.svd(np.random.randn(*shape[:-2], shape[-2], shape[-2]))[0]
+    v = np.linalg.svd(np.random.randn(*shape[:-2], shape[-1], shape[-1]))[0]
+    s = 2.0 ** -np.arange(min(shape[-2:]))
+    r = len(s)
+    return u[..., :r], s, v[..., :r]
+
+
+def test_randomized_svd(check_lazy_shapes):
+    u, s, v = _low_rank(2, 8, 6)
+    a = np.matmul(u * s[..., None, :], np.swapaxes(v, -1, -2))
+    for a_fw in Matrix(mat=a).forms():
+        state = B.create_random_state(B.dtype(a_fw), seed=0)
+        state, (u_est, s_est, v_est) = B.randomized_svd(state, a_fw, 3, power_iters=1)
+        approx(s_est, np.broadcast_to(s[:3], (2, 3)))
+        approx(
+            B.matmul(u_est * s_est[..., None, :], v_est, tr_b=True),
+            np.matmul(u[..., :3] * s[:3], np.swapaxes(v[..., :3], -1, -2)),
+            atol=1e-8,
+        )
+
+    # Check a function, which must multiply by a symmetric matrix.
+    a = PSD(5).np()
+    _, s_est, _ = B.randomized_svd(lambda x: a @ x, 2, n=5)
+    approx(s_est, np.linalg.svd(a)[1][:2])
+    with pytest.raises(ValueError):
+        B.randomized_svd(lambda x: a @ x, 2)
+
+
+def test_eigh_topk(check_lazy_shapes):
+    u, _, _ = _low_rank(7, 7)
+    vals = np.array([4, -3, 2, 1, -0.5, 0.1, 0])
+    a = (u * vals) @ u.T
+    for a_fw in Matrix(mat=a).forms():
+        vals_est, vecs_est = B.eigh_topk(a_fw, 3)
+        approx(vals_est, vals[:3])
+        approx(B.matmul(a_fw, vecs_est), vecs_est * vals_est[None, :], atol=1e-8)
+
+    # Check a function and batching.
+    vals_est, _ = B.eigh_topk(lambda x: a @ x, 2, n=7)
+    approx(vals_est, vals[:2])
+    vals_est, vecs_est = B.eigh_topk(np.stack([a, 2 * a]), 2)
+    approx(vals_est, np.stack([vals[:2], 2 * vals[:2]]))
+    assert B.shape(vecs_est) == (2, 7, 2)
+
+    # Check eigenvalues of equal magnitude and opposite signs.
+    vals = np.array([3, -3, 1, 0.5, 0, 0, 0])
+    a = (u * vals) @ u.T
+    for a_fw in Matrix(mat=a).forms():
+        vals_est, vecs_est = B.eigh_topk(a_fw, 2)
+        approx(np.sort(B.to_numpy(vals_est)), [-3, 3])
+        approx(B.matmul(a_fw, vecs_est), vecs_est * vals_est[None, :], atol=1e-8)
 
 
 @pytest.mark.parametrize("shape", [(5,), (5, 1), (5, 2), (3, 5, 1), (3, 5, 2)])
@@ -325,6 +1091,165 @@ def test_pw_2d(check_lazy_shapes, batch_a, batch_b):
     _approx(B.pw_sums(a), np.maximum(sums2_aa, 1e-30) ** 0.5)
 
 
+@pytest.mark.parametrize("f", [B.pw_dists2, B.pw_dists, B.pw_sums2, B.pw_sums])
+@pytest.mark.parametrize(
+    "kw_args",
+    [
+        {"block_size": 3},
+        {"block_size": (2, 4)},
+        {"block_size": 100},
+        {"memory_budget": 8 * 3 * 10},
+        {"memory_budget": 8 * 3 * 5},
+        {"memory_budget": 1},
+    ],
+)
+@pytest.mark.parametrize("d", [1, 2])
+def test_pw_blocked(f, kw_args, d, check_lazy_shapes):
+    a = Tensor(3, 5, d)
+    b = Tensor(10, d)
+    for a_fw, b_fw in zip(a.forms(), b.forms()):
+        approx(f(a_fw, b_fw, **kw_args), f(a_fw, b_fw))
+    approx(f(a.np(), **kw_args), f(a.np()))
+
+
+@pytest.mark.parametrize("f", [B.pw_dists2, B.pw_dists, B.pw_sums2, B.pw_sums])
+@pytest.mark.parametrize("kw_args", [{}, {"block_size": 2}, {"block_size": (2, 3)}])
+def test_pw_symmetric(f, kw_args, check_lazy_shapes):
+    a = Tensor(3, 5, 2)
+    for a_fw in a.forms():
+        res = f(a_fw, **kw_args)
+        approx(res, f(a_fw, a_fw), atol=1e-7)
+        approx(res, B.transpose(res))
+    if f is B.pw_dists2 and kw_args.get("block_size") != (2, 3):
+        # For square tiles, the diagonal should be exactly zero.
+        res = B.to_numpy(B.pw_dists2(a.np(), **kw_args))
+        assert np.all(np.diagonal(res, axis1=-2, axis2=-1) == 0)
+        assert np.all(res >= 0)
+    if f is B.pw_dists:
+        # The diagonal should always be exactly zero.
+        for a_fw in a.forms():
+            res = B.to_numpy(B.pw_dists(a_fw, **kw_args))
+            assert np.all(np.diagonal(res, axis1=-2, axis2=-1) == 0)
+        # The gradient must be finite despite the zeros.
+        grad = jax.grad(lambda x: B.sum(B.pw_dists(x, **kw_args)))(jnp.array(a.np()))
+        assert np.all(np.isfinite(grad))
+
+
+@pytest.mark.parametrize("kw_args", [{}, {"block_size": (2, 3)}])
+def test_pw_dists2_nonnegative(kw_args, check_lazy_shapes):
+    # Cancellation for near-duplicate points far from the origin must not give
+    # negative squared distances.
+    a = 1e4 + 1e-6 * np.random.randn(6, 3)
+    b = a + 1e-9 * np.random.randn(6, 3)
+    for a_fw, b_fw in zip(Matrix(mat=a).forms(), Matrix(mat=b).forms()):
+        assert np.all(B.to_numpy(B.pw_dists2(a_fw, b_fw, **kw_args)) >= 0)
+        assert np.all(B.to_numpy(B.pw_dists2(a_fw, **kw_args)) >= 0)
+        assert not np.any(np.isnan(B.to_numpy(B.pw_dists(a_fw, b_fw, **kw_args))))
+
+
+def test_pw_dists2_blocks(check_lazy_shapes):
+    a = Tensor(3, 5, 2).np()
+    b = Tensor(10, 2).np()
+    res = np.full((3, 5, 10), np.nan)
+    for rows, cols, tile in B.pw_dists2_blocks(a, b, block_size=(2, 4)):
+        assert B.shape(tile) == (3, rows.stop - rows.start, cols.stop - cols.start)
+        assert B.shape(tile)[1:] in {(2, 4), (2, 2), (1, 4), (1, 2)}
+        res[..., rows, cols] = tile
+    approx(res, B.pw_dists2(a, b))
+
+    # Check the memory budget. This gives tiles which span all columns.
+    tiles = list(B.pw_dists2_blocks(a, b, memory_budget=8 * 3 * 20))
+    assert len(tiles) == 3
+    approx(B.concat(*(tile for _, _, tile in tiles), axis=-2), B.pw_dists2(a, b))
+
+    # Check the single-argument form. This gives square tiles.
+    res = np.full((3, 5, 5), np.nan)
+    tiles = list(B.pw_dists2_blocks(a, memory_budget=8 * 3 * 9))
+    assert len(tiles) == 4
+    for rows, cols, tile in tiles:
+        res[..., rows, cols] = tile
+    approx(res, B.pw_dists2(a, a))
+    assert np.all(np.diagonal(res, axis1=-2, axis2=-1) == 0)
+
+
+@pytest.mark.parametrize("batch", [(), (2,)])
+@pytest.mark.parametrize(
+    "kw_args",
+    [{}, {"block_size": 3}, {"block_size": (4, 5)}, {"memory_budget": 8 * 2 * 12}],
+)
+def test_knn(batch, kw_args, check_lazy_shapes):
+    a = Tensor(*batch, 7, 3)
+    b = Tensor(20, 3)
+    dists = B.pw_dists(a.np(), b.np())
+    ref = np.argsort(dists, axis=-1)[..., :4]
+    for a_fw, b_fw in zip(a.forms(), b.forms()):
+        indices, res = B.knn(a_fw, b_fw, 4, **kw_args)
+        assert B.shape(indices) == (*batch, 7, 4)
+        approx(indices, ref)
+        approx(res, np.take_along_axis(dists, ref, axis=-1))
+
+    # Check the nearest neighbour of every row of `b` is itself.
+    indices, res = B.knn(b.np(), b.np(), 1, **kw_args)
+    approx(indices[:, 0], np.arange(20))
+
+    # For integer coordinates, the arithmetic is exact, so exact matches must have
+    # distance exactly zero.
+    c = np.random.randint(-5, 5, size=(20, 3)).astype(np.float64)
+    _, res = B.knn(c, c, 1, **kw_args)
+    assert np.all(res == 0)
+
+    # Cannot ask for more neighbours than there are rows.
+    with pytest.raises(ValueError):
+        B.knn(a.np(), b.np(), 21)
+
+
+def _cdist(a, b, metric, cov):
+    if metric == "cosine":
+        return 1 - scipy.spatial.distance.cdist(a, b, "cosine")
+    elif metric == "manhattan":
+        return scipy.spatial.distance.cdist(a, b, "cityblock")
+    elif metric == "mahalanobis":
+        vi = np.linalg.inv(cov)
+        return scipy.spatial.distance.cdist(a, b, "mahalanobis", VI=vi)
+    else:
+        return scipy.spatial.distance.cdist(a, b, metric)
+
+
+@pytest.mark.parametrize(
+    "metric", ["euclidean", "sqeuclidean", "cosine", "manhattan", "mahalanobis"]
+)
+@pytest.mark.parametrize("kw_args", [{}, {"block_size": 3}, {"memory_budget": 80}])
+def test_pw_metric(metric, kw_args, check_lazy_shapes):
+    a = Tensor(5, 3)
+    b = Tensor(7, 3)
+    cov = PSD(3)
+    chol = Tensor(mat=B.cholesky(cov.np()))
+    for a_fw, b_fw, chol_fw in zip(a.forms(), b.forms(), chol.forms()):
+        if metric == "mahalanobis":
+            kw_args = dict(kw_args, chol=chol_fw)
+        approx(
+            B.pw_metric(a_fw, b_fw, metric, **kw_args),
+            _cdist(a.np(), b.np(), metric, cov.np()),
+            atol=1e-7,
+        )
+        approx(
+            B.pw_metric(a_fw, metric, **kw_args),
+            _cdist(a.np(), a.np(), metric, cov.np()),
+            atol=1e-7,
+        )
+
+
+def test_pw_metric_default_and_errors(check_lazy_shapes):
+    a = Tensor(5, 3).np()
+    b = Tensor(7, 3).np()
+    approx(B.pw_metric(a, b), B.pw_dists(a, b))
+    approx(B.pw_metric(a), B.pw_dists(a))
+    with pytest.raises(ValueError):
+        B.pw_metric(a, b, "hamming")
+    with pytest.raises(ValueError):
+        B.pw_metric(a, b, "mahalanobis")
+
+
 @pytest.mark.parametrize("batch_a", [False, True])
 @pytest.mark.parametrize("batch_b", [False, True])
 def test_pw_1d(check_lazy_shapes, batch_a, batch_b):
@@ -1,6 +1,10 @@
+import threading
+import time
+
 import numpy as np
 import plum
 import pytest
+import torch
 from plum import NotFoundLookupError
 
 import lab as B
@@ -8,6 +12,7 @@ import lab.autograd as B_autograd
 import lab.jax as B_jax
 import lab.tensorflow as B_tf
 import lab.torch as B_torch
+import lab.util
 from lab.util import (
     _common_shape,
     _translate_index,
@@ -111,6 +116,53 @@ def test_batch_computation(x1_batch, x2_batch, check_lazy_shapes):
     x1 = np.random.randn(*(x1_batch + (3, 4)))
     x2 = np.random.randn(*(x2_batch + (4, 5)))
     approx(batch_computation(np.matmul, (x1, x2), (2, 2)), np.matmul(x1, x2))
+    approx(
+        batch_computation(np.matmul, (x1, x2), (2, 2), workers=2),
+        np.matmul(x1, x2),
+    )
+
+
+@pytest.mark.parametrize("x1_batch", [(), (2,), (2, 2), (2, 1)])
+@pytest.mark.parametrize("x2_batch", [(), (2,), (2, 2), (1, 2)])
+def test_batch_computation_vectorised(x1_batch, x2_batch, check_lazy_shapes):
+    x1 = np.random.randn(*(x1_batch + (3, 4)))
+    x2 = np.random.randn(*(x2_batch + (4, 5)))
+
+    def vectorised(x1_, x2_):
+        # Check that all batch dimensions are compressed into one.
+        assert B.rank(x1_) == 3 and B.rank(x2_) == 3
+        return np.matmul(x1_, x2_)
+
+    approx(
+        batch_computation(np.matmul, (x1, x2), (2, 2), vectorised=vectorised),
+        np.matmul(x1, x2),
+    )
+
+
+def test_batch_computation_non_numpy(check_lazy_shapes):
+    x1 = B.randn(torch.float64, 2, 3, 4)
+    x2 = B.randn(torch.float64, 4, 5)
+    res = batch_computation(torch.matmul, (x1, x2), (2, 2), workers=2)
+    assert isinstance(res, torch.Tensor)
+    approx(res, torch.matmul(x1, x2))
+
+
+def test_batch_computation_workers(monkeypatch, check_lazy_shapes):
+    x1 = np.random.randn(4, 3, 3)
+    x2 = np.random.randn(4, 3, 2)
+    monkeypatch.setattr(lab.util, "batch_computation_workers", 3)
+
+    # Check that the setting is used by recording the threads which run `f`.
+    threads = set()
+
+    def f(x1, x2):
+        threads.add(threading.get_ident())
+        # Give the other threads a chance to start.
+        time.sleep(0.01)
+        return np.linalg.solve(x1, x2)
+
+    approx(batch_computation(f, (x1, x2), (2, 2)), np.linalg.solve(x1, x2))
+    assert len(threads) > 1
 
 
 def test_metadata(check_lazy_shapes):